@@ -0,0 +1,201 @@
+import os
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Embedding model used for local semantic grading
+GRADER_MODEL = os.getenv("GRADER_MODEL", "all-MiniLM-L6-v2")
+
+# Similarity at or above ACCEPT_THRESHOLD is correct, at or below REJECT_THRESHOLD is incorrect.
+# Anything in between is ambiguous and may be escalated to the LLM.
+ACCEPT_THRESHOLD = float(os.getenv("GRADER_ACCEPT_THRESHOLD", 0.80))
+REJECT_THRESHOLD = float(os.getenv("GRADER_REJECT_THRESHOLD", 0.55))
+
+# Question types graded by meaning rather than by exact option text
+FREE_TEXT_TYPES = {"short answer", "long answer", "short", "long", "descriptive"}
+
+_model = None
+_model_lock = threading.Lock()
+_warm_up_started = False
+_reference_cache = {}
+_reference_lock = threading.Lock()
+REFERENCE_CACHE_SIZE = int(os.getenv("GRADER_CACHE_SIZE", 10000))
+
+
+def _normalize(text):
+    return " ".join(str(text or "").strip().lower().split())
+
+
+def is_free_text(question_type):
+    """Returns True if answers of this question type should be graded semantically."""
+    return _normalize(question_type) in FREE_TEXT_TYPES
+
+
+def get_model():
+    """Loads the sentence-transformers model once per process."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            from sentence_transformers import SentenceTransformer
+            _model = SentenceTransformer(GRADER_MODEL, device="cpu")
+    return _model
+
+
+def warm_up(background=True):
+    """
+    Loads the model and runs one encode so the first submission does not pay the start-up cost.
+
+    With background=True the work happens in a daemon thread and this returns immediately.
+    Safe to call on every Streamlit rerun; only the first call does anything.
+    """
+    global _warm_up_started
+    with _model_lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+
+    def load():
+        try:
+            _embed(["warm up"])
+        except Exception as e:
+            print(f"❌ Could not load grading model {GRADER_MODEL}: {str(e)}")
+
+    if background:
+        threading.Thread(target=load, name="grader-warm-up", daemon=True).start()
+    else:
+        load()
+
+
+def _embed(texts):
+    """Embeds a list of texts in a single batch as L2-normalized float32 vectors."""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    embeddings = get_model().encode(
+        texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False
+    )
+    return embeddings.astype(np.float32, copy=False)
+
+
+def get_reference_embeddings(reference_answers):
+    """Returns embeddings for the reference answers, embedding only the ones not already cached."""
+    keys = [_normalize(ans) for ans in reference_answers]
+
+    # The cache is shared by every session, so vectors are copied out under the lock and the
+    # result is built from this call's own copies rather than by reading the cache again
+    with _reference_lock:
+        vectors = {k: _reference_cache[k] for k in keys if k in _reference_cache}
+    missing = list(dict.fromkeys(k for k in keys if k not in vectors))
+
+    if missing:
+        embedded = dict(zip(missing, _embed(missing)))
+        vectors.update(embedded)
+        with _reference_lock:
+            if len(_reference_cache) + len(embedded) > REFERENCE_CACHE_SIZE:
+                _reference_cache.clear()
+            _reference_cache.update(embedded)
+
+    return np.stack([vectors[k] for k in keys])
+
+
+def _llm_verdicts(items):
+    # Imported lazily so grading works without GROQ_API_KEY when the LLM is never needed
+    from backend.feedback_generator import judge_answers
+    return judge_answers(items)
+
+
+def grade_answers(user_answers, correct_answers, questions=None, use_llm=True):
+    """
+    Grades a whole submission of free-text answers at once.
+
+    Exact matches are accepted without embedding. The remaining answers are embedded in one
+    batch and compared against cached reference embeddings with vectorized cosine similarity.
+    Answers whose similarity falls between the reject and accept thresholds are sent to the LLM
+    together in a single request.
+
+    Args:
+        user_answers (list): The submitted answers.
+        correct_answers (list): The reference answers, aligned with user_answers.
+        questions (list): Optional question texts, used when escalating to the LLM.
+        use_llm (bool): Whether ambiguous answers may be escalated to the LLM.
+
+    Returns:
+        list: One {"score": float, "is_correct": bool, "method": str} per answer.
+    """
+    results = [None] * len(user_answers)
+    pending = []
+
+    for i, (user_ans, correct_ans) in enumerate(zip(user_answers, correct_answers)):
+        user_norm, correct_norm = _normalize(user_ans), _normalize(correct_ans)
+        if not user_norm or not correct_norm:
+            results[i] = {"score": 0.0, "is_correct": False, "method": "empty"}
+        elif user_norm == correct_norm:
+            results[i] = {"score": 1.0, "is_correct": True, "method": "exact"}
+        else:
+            pending.append(i)
+
+    if not pending:
+        return results
+
+    user_vectors = _embed([_normalize(user_answers[i]) for i in pending])
+    reference_vectors = get_reference_embeddings([correct_answers[i] for i in pending])
+    # Both sides are normalized, so the row-wise dot product is the cosine similarity
+    similarities = np.clip(np.einsum("ij,ij->i", user_vectors, reference_vectors), 0.0, 1.0)
+
+    midpoint = (ACCEPT_THRESHOLD + REJECT_THRESHOLD) / 2
+    ambiguous = []
+    for i, similarity in zip(pending, similarities.tolist()):
+        if similarity >= ACCEPT_THRESHOLD:
+            results[i] = {"score": similarity, "is_correct": True, "method": "semantic"}
+        else:
+            results[i] = {"score": similarity, "is_correct": similarity >= midpoint, "method": "semantic"}
+            if similarity > REJECT_THRESHOLD and use_llm:
+                ambiguous.append(i)
+
+    if ambiguous:
+        # All ambiguous answers go to the LLM in one request; any it does not answer keep the similarity verdict
+        try:
+            verdicts = _llm_verdicts([
+                (questions[i] if questions else "", user_answers[i], correct_answers[i]) for i in ambiguous
+            ])
+        except Exception as e:
+            print(f"❌ LLM grading failed, using similarity only: {str(e)}")
+            verdicts = []
+        for i, verdict in zip(ambiguous, verdicts):
+            if verdict is not None:
+                results[i] = {"score": results[i]["score"], "is_correct": verdict, "method": "llm"}
+
+    return results
+
+
+def grade_submission(questions, user_answers, correct_answers, question_types, use_llm=True):
+    """
+    Grades a mixed submission. Option-based answers (MCQ, True/False) are matched exactly,
+    free-text answers are graded together in one semantic batch.
+
+    Returns:
+        list: One {"score": float, "is_correct": bool, "method": str} per answer.
+    """
+    results = [None] * len(user_answers)
+    free_text = []
+
+    for i, (user_ans, correct_ans, q_type) in enumerate(zip(user_answers, correct_answers, question_types)):
+        if is_free_text(q_type):
+            free_text.append(i)
+        else:
+            is_correct = bool(_normalize(correct_ans)) and _normalize(user_ans) == _normalize(correct_ans)
+            results[i] = {"score": 1.0 if is_correct else 0.0, "is_correct": is_correct, "method": "exact"}
+
+    if free_text:
+        graded = grade_answers(
+            [user_answers[i] for i in free_text],
+            [correct_answers[i] for i in free_text],
+            [questions[i] for i in free_text],
+            use_llm=use_llm
+        )
+        for i, result in zip(free_text, graded):
+            results[i] = result
+
+    return results
@@ -1,102 +1,111 @@
-import mysql.connector
-import os
 from dotenv import load_dotenv
+from backend.storage import get_backend
 
 # Load environment variables
 load_dotenv()
 
+# Storage backend selected by DB_BACKEND (mysql or sqlite)
+_backend = get_backend()
+
 def get_db_connection():
-    """Returns a new database connection."""
-    return mysql.connector.connect(
-        host=os.getenv("MYSQL_HOST"),
-        user=os.getenv("MYSQL_USER"),
-        password=os.getenv("MYSQL_PASSWORD"),
-        database=os.getenv("MYSQL_DATABASE"),
-        port=int(os.getenv("MYSQL_PORT", 3306))
-    )
-
-# Initialize the database connection
-conn = get_db_connection()
-cursor = conn.cursor(dictionary=True)
+    """Returns a database connection from the configured backend."""
+    return _backend.connect()
+
+def release_db_connection(conn):
+    """Returns a connection obtained from get_db_connection to the backend."""
+    _backend.release(conn)
 
 # Ensure database and table exist
 def initialize_database():
-    """Ensure the database and questions table exist."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    """Ensure the database tables and indexes exist."""
+    _backend.initialize()
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS questions (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            subject VARCHAR(255) NOT NULL,
-            question TEXT NOT NULL,
-            answer TEXT,
-            difficulty VARCHAR(50) NOT NULL,
-            question_type VARCHAR(50) NOT NULL,
-            bloom_level VARCHAR(50) NOT NULL
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS quiz_results (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id VARCHAR(50) NOT NULL,
-            quiz_id VARCHAR(50) NOT NULL,
-            score INT NOT NULL,
-            total_questions INT NOT NULL,
-            percentage FLOAT NOT NULL
-        )
-    """)
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
+QUESTION_INSERT = """
+    INSERT INTO questions (subject, question, answer, difficulty, question_type, bloom_level, syllabus)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+OPTION_INSERT = """
+    INSERT INTO question_options (question_id, option_index, option_text, is_correct)
+    VALUES (%s, %s, %s, %s)
+"""
+
+def _option_rows(question_id, options, answer):
+    """Rows for question_options, flagging the option whose text matches the answer."""
+    answer = (answer or "").strip()
+    return [(question_id, idx, opt, opt.strip() == answer) for idx, opt in enumerate(options or [])]
 
 # Insert a single question
-def insert_question(subject, question, answer, difficulty, question_type, bloom_level):
-    """Inserts a single question into the database with all required fields."""
+def insert_question(subject, question, answer, difficulty, question_type, bloom_level, syllabus=None, options=None):
+    """Inserts a single question, and its MCQ options if given, into the database. Returns the new id."""
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    query = """
-        INSERT INTO questions (subject, question, answer, difficulty, question_type, bloom_level)
-        VALUES (%s, %s, %s, %s, %s, %s)
-    """
-    values = (subject, question, answer, difficulty, question_type, bloom_level)
+    values = (subject, question, answer, difficulty, question_type, bloom_level, syllabus)
     
     try:
-        cursor.execute(query, values)
+        cursor.execute(_backend.sql(QUESTION_INSERT), values)
+        question_id = cursor.lastrowid
+        if options:
+            cursor.executemany(_backend.sql(OPTION_INSERT), _option_rows(question_id, options, answer))
         conn.commit()
         print(f"✅ Inserted question: {question} with answer: {answer}")
+        return question_id
     except Exception as e:
         print(f"❌ Error inserting question: {str(e)}")
         conn.rollback()
+        return None
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 # Bulk insert questions
 def insert_bulk_questions(question_data):
-    """ Insert multiple questions into the MySQL database efficiently. """
+    """
+    Insert multiple questions and their MCQ options into the database in one transaction.
+
+    Each question dict may carry an "options" list. Returns the new question ids in input order.
+    """
     if not question_data:
         print("⚠️ No questions to insert.")
-        return
+        return []
 
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    query = """
-        INSERT INTO questions (subject, question, answer, difficulty, question_type, bloom_level)
-        VALUES (%s, %s, %s, %s, %s, %s)
-    """
-    values = [(q["subject"], q["question"], q["answer"], q["difficulty"], q["question_type"], q["bloom_level"]) for q in question_data]
+    rows = [
+        (q["subject"], q["question"], q["answer"], q["difficulty"], q["question_type"], q["bloom_level"], q.get("syllabus"))
+        for q in question_data
+    ]
+    option_rows = []
 
-    cursor.executemany(query, values)
-    conn.commit()
+    try:
+        # All questions go in one batch; one query then confirms the ids they were given
+        cursor.executemany(_backend.sql(QUESTION_INSERT), rows)
+        question_ids = _backend.inserted_ids(cursor, len(rows))
 
-    cursor.close()
-    conn.close()
-    print(f"✅ Inserted {len(question_data)} questions into the database.")
+        cursor.execute(_backend.sql("SELECT id, question FROM questions WHERE id BETWEEN %s AND %s ORDER BY id"),
+                       (question_ids[0], question_ids[-1]))
+        stored = cursor.fetchall()
+        if [row[0] for row in stored] != question_ids or [row[1] for row in stored] != [r[1] for r in rows]:
+            raise RuntimeError("Inserted question ids could not be resolved")
+
+        for question_id, q in zip(question_ids, question_data):
+            option_rows.extend(_option_rows(question_id, q.get("options"), q["answer"]))
+
+        if option_rows:
+            cursor.executemany(_backend.sql(OPTION_INSERT), option_rows)
+        conn.commit()
+    except Exception as e:
+        print(f"❌ Error inserting questions: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+
+    print(f"✅ Inserted {len(question_data)} questions with {len(option_rows)} options into the database.")
+    return question_ids
 
 # Save quiz results
 def save_quiz_result(user_id, quiz_id, score, total_questions):
@@ -111,39 +120,77 @@ def save_quiz_result(user_id, quiz_id, score, total_questions):
     percentage = (score / total_questions) * 100 if total_questions > 0 else 0.0
     values = (user_id, quiz_id, score, total_questions, percentage)
     
-    cursor.execute(query, values)
-    conn.commit()
-
-    cursor.close()
-    conn.close()
+    try:
+        cursor.execute(_backend.sql(query), values)
+        conn.commit()
+    except Exception as e:
+        print(f"❌ Error saving quiz result: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        release_db_connection(conn)
     print(f"✅ Quiz result saved: User {user_id}, Score {score}/{total_questions}")
 
-def get_options_for_question(question_id):
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    
-    query = "SELECT option_text FROM options_table WHERE question_id = %s"
-    cursor.execute(query, (question_id,))
-    
-    options = [row[0] for row in cursor.fetchall()]
+def get_options_for_questions(question_ids):
+    """
+    Fetch the options of many questions with a single query.
+
+    Returns:
+        dict: {question_id: [option_text, ...]} in option order. Questions without options are omitted.
+    """
+    question_ids = [qid for qid in dict.fromkeys(question_ids) if qid is not None]
+    if not question_ids:
+        return {}
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
     
-    cursor.close()
-    connection.close()
-    return options if options else ["Option 1", "Option 2", "Option 3", "Option 4"]
+    query = f"""
+        SELECT question_id, option_text
+        FROM question_options
+        WHERE question_id IN ({", ".join(["%s"] * len(question_ids))})
+        ORDER BY question_id, option_index
+    """
+    try:
+        cursor.execute(_backend.sql(query), question_ids)
+        options = {}
+        for question_id, option_text in cursor.fetchall():
+            options.setdefault(question_id, []).append(option_text)
+        return options
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+
+def get_options_for_question(question_id):
+    """Fetch the options of a single question."""
+    return get_options_for_questions([question_id]).get(question_id, [])
 
-def get_questions(subject, question_type, difficulty, num_questions):
-    """Fetch questions from database with proper parameters"""
+def get_questions(subject, question_type, difficulty, num_questions, user_id=None):
+    """Fetch questions from database with proper parameters; with a user_id, questions the user has not seen come first"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = _backend.dict_cursor(conn)
         
-        query = """
-            SELECT question, answer, difficulty, question_type 
-            FROM questions 
-            WHERE subject = %s AND question_type = %s AND difficulty = %s
-            LIMIT %s
-        """
-        cursor.execute(query, (subject, question_type, difficulty, num_questions))
+        if user_id:
+            query = """
+                SELECT q.id, q.question, q.answer, q.difficulty, q.question_type
+                FROM questions q
+                LEFT JOIN question_exposures e ON e.question_id = q.id AND e.user_id = %s
+                WHERE q.subject = %s AND q.question_type = %s AND q.difficulty = %s
+                ORDER BY CASE WHEN e.question_id IS NULL THEN 0 ELSE 1 END, q.id DESC
+                LIMIT %s
+            """
+            params = (user_id, subject, question_type, difficulty, num_questions)
+        else:
+            query = """
+                SELECT id, question, answer, difficulty, question_type 
+                FROM questions 
+                WHERE subject = %s AND question_type = %s AND difficulty = %s
+                LIMIT %s
+            """
+            params = (subject, question_type, difficulty, num_questions)
+        cursor.execute(_backend.sql(query), params)
         questions = cursor.fetchall()
         
         return questions
@@ -153,10 +200,113 @@ def get_questions(subject, question_type, difficulty, num_questions):
         return []
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
+        if 'conn' in locals(): release_db_connection(conn)
+
+def get_questions_by_ids(question_ids):
+    """Fetch questions by id with a single query, in the order the ids were given."""
+    question_ids = [qid for qid in dict.fromkeys(question_ids) if qid is not None]
+    if not question_ids:
+        return []
+
+    try:
+        conn = get_db_connection()
+        cursor = _backend.dict_cursor(conn)
+        
+        query = f"""
+            SELECT id, question, answer, difficulty, question_type, bloom_level, syllabus
+            FROM questions
+            WHERE id IN ({", ".join(["%s"] * len(question_ids))})
+        """
+        cursor.execute(_backend.sql(query), question_ids)
+        rows = {row["id"]: row for row in cursor.fetchall()}
+        
+        return [rows[qid] for qid in question_ids if qid in rows]
+        
+    except Exception as e:
+        print(f"Database error: {e}")
+        return []
+    finally:
+        if 'cursor' in locals(): cursor.close()
+        if 'conn' in locals(): release_db_connection(conn)
+
+def get_bank_candidates(subject, difficulty, question_type, bloom_level, user_id=None, limit=100):
+    """
+    Fetch stored questions matching a generation request, unseen ones first.
+
+    Returns:
+        list: Question rows, each with a "seen" flag for the given user.
+    """
+    try:
+        conn = get_db_connection()
+        cursor = _backend.dict_cursor(conn)
+        
+        query = """
+            SELECT q.id, q.question, q.answer, q.difficulty, q.question_type, q.bloom_level, q.syllabus,
+                   CASE WHEN e.question_id IS NULL THEN 0 ELSE 1 END AS seen
+            FROM questions q
+            LEFT JOIN question_exposures e ON e.question_id = q.id AND e.user_id = %s
+            WHERE q.subject = %s AND q.difficulty = %s AND q.question_type = %s AND q.bloom_level = %s
+            ORDER BY seen, q.id DESC
+            LIMIT %s
+        """
+        cursor.execute(_backend.sql(query), (user_id or "", subject, difficulty, question_type, bloom_level, int(limit)))
+        return cursor.fetchall()
+        
+    except Exception as e:
+        print(f"Database error: {e}")
+        return []
+    finally:
+        if 'cursor' in locals(): cursor.close()
+        if 'conn' in locals(): release_db_connection(conn)
+
+def record_exposures(user_id, question_ids):
+    """Remember which questions a user has been shown so quizzes and bank-first generation can prefer new ones."""
+    question_ids = [qid for qid in dict.fromkeys(question_ids) if qid is not None]
+    if not user_id or not question_ids:
+        return
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    query = "INSERT IGNORE INTO question_exposures (user_id, question_id) VALUES (%s, %s)"
+    try:
+        cursor.executemany(_backend.sql(query), [(user_id, qid) for qid in question_ids])
+        conn.commit()
+    except Exception as e:
+        print(f"❌ Error recording exposures: {str(e)}")
+        conn.rollback()
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+
+def search_questions(query, subject=None, question_type=None, limit=20, offset=0):
+    """
+    Ranked full-text search over question text, answers and syllabus topics.
+
+    Plain queries use natural language relevance ranking. Queries containing boolean
+    operators (+word, -word, "phrase", prefix*) are run in boolean mode.
+
+    Returns:
+        list: Matching questions ordered by relevance, each with a "score" key.
+    """
+    query = (query or "").strip()
+    if not query:
+        return []
+
+    sql, params = _backend.search_query(query, subject, question_type, limit, offset)
+    try:
+        conn = get_db_connection()
+        cursor = _backend.dict_cursor(conn)
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    except Exception as e:
+        print(f"Database error: {e}")
+        return []
+    finally:
+        if 'cursor' in locals(): cursor.close()
+        if 'conn' in locals(): release_db_connection(conn)
 
-# Ensure conn is available for import
-all = ["conn", "cursor", "insert_bulk_questions", "insert_question", "get_questions", "save_quiz_result"]
+all = ["insert_bulk_questions", "insert_question", "get_questions", "get_questions_by_ids", "get_options_for_questions", "get_bank_candidates", "record_exposures", "save_quiz_result", "search_questions"]
 
 # Initialize the database when the script is first executed
 initialize_database()
\ No newline at end of file
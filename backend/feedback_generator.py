@@ -1,4 +1,5 @@
 import os
+import re
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
 
@@ -35,3 +36,36 @@ def generate_feedback(question, user_answer, correct_answer):
     response = llm.invoke(prompt).content.strip()
     
     return response
+
+def judge_answers(items):
+    """
+    Uses AI to decide, in a single request, whether free-text answers are correct when local grading is inconclusive.
+
+    Args:
+        items (list): (question, user_answer, correct_answer) tuples.
+
+    Returns:
+        list: One verdict per item; True or False, or None if the reply did not cover that item.
+    """
+    if not items:
+        return []
+
+    answers = "\n".join(
+        f"{n}. Question: {question}\n   User Answer: {user_answer}\n   Correct Answer: {correct_answer}"
+        for n, (question, user_answer, correct_answer) in enumerate(items, 1)
+    )
+    prompt = f"""
+    {answers}
+    
+    For each numbered item, does the user's answer convey the same meaning as the correct answer?
+    Reply with one line per item in the form "<number>: CORRECT" or "<number>: INCORRECT" and nothing else.
+    """
+    
+    response = llm.invoke(prompt).content.upper()
+    
+    verdicts = [None] * len(items)
+    for number, verdict in re.findall(r"(\d+)\s*[:.)-]\s*(CORRECT|INCORRECT)", response):
+        index = int(number) - 1
+        if 0 <= index < len(items) and verdicts[index] is None:
+            verdicts[index] = verdict == "CORRECT"
+    return verdicts
@@ -0,0 +1,276 @@
+import math
+import os
+import re
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# llama3-8b-8192 shares one 8192-token window between the prompt and the completion
+CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", 8192))
+MAX_COMPLETION_TOKENS = int(os.getenv("LLM_MAX_COMPLETION_TOKENS", 4096))
+SAFETY_MARGIN = 256
+
+# Per-section prompt budgets
+SYLLABUS_MAX_TOKENS = 1024
+EXAMPLES_MAX_TOKENS = 512
+MAX_EXAMPLES = 5
+EXCLUSIONS_MAX_TOKENS = 768
+DOCUMENT_MAX_TOKENS = 5000
+
+# Evenly spaced excerpts taken from a document part that does not fit its section budget
+SECTION_EXCERPTS = 8
+
+# Beyond this the model tends to stop early regardless of the remaining budget
+MAX_QUESTIONS_PER_CALL = int(os.getenv("MAX_QUESTIONS_PER_CALL", 25))
+
+# Expected completion tokens for one question, without its answer
+QUESTION_TOKENS = {
+    "mcq": 80,
+    "true/false": 30,
+    "short answer": 45,
+    "long answer": 60,
+    "pdf mcq": 90,
+}
+DEFAULT_QUESTION_TOKENS = 60
+
+# Expected answer tokens per mark of weightage for free-text formats
+ANSWER_TOKENS_PER_MARK = 15
+
+
+def estimate_tokens(text):
+    """Estimates the Llama-3 token count of a text without loading a tokenizer."""
+    if not text:
+        return 0
+    text = str(text)
+    # ~4 characters per token for English prose, but short words and symbols tokenize denser
+    return max(math.ceil(len(text) / 4), math.ceil(len(text.split()) * 1.3))
+
+
+def completion_tokens_per_question(q_format, include_answers=False, marks_weightage=1):
+    """Expected completion tokens for a single question of the given format."""
+    q_format = q_format.lower()
+    tokens = QUESTION_TOKENS.get(q_format, DEFAULT_QUESTION_TOKENS)
+    if include_answers and q_format not in ("mcq", "pdf mcq"):
+        # MCQ answers are marked inline on the options, other formats get a written answer
+        marks = marks_weightage if q_format != "true/false" else 1
+        tokens += ANSWER_TOKENS_PER_MARK * max(1, int(marks))
+    return tokens
+
+
+def _words(text):
+    return set(re.findall(r"[a-z0-9]+", str(text).lower()))
+
+
+def compress_syllabus(syllabus, max_tokens=SYLLABUS_MAX_TOKENS):
+    """
+    Compresses the syllabus to a de-duplicated, comma separated topic list within max_tokens.
+
+    Topics are kept in their original order; topics that do not fit are dropped.
+    """
+    topics = []
+    seen = set()
+    for topic in re.split(r"[\n,;]+", syllabus or ""):
+        topic = " ".join(topic.split())
+        if topic and topic.lower() not in seen:
+            seen.add(topic.lower())
+            topics.append(topic)
+
+    kept = []
+    used = 0
+    for topic in topics:
+        cost = estimate_tokens(topic) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(topic)
+        used += cost
+
+    if not kept and topics:
+        # A single oversized topic is truncated rather than dropped entirely
+        kept = [topics[0][:max_tokens * 4]]
+
+    return ", ".join(kept)
+
+
+def select_examples(example_questions, syllabus, max_tokens=EXAMPLES_MAX_TOKENS, max_examples=MAX_EXAMPLES):
+    """
+    Ranks few-shot examples by word overlap with the syllabus and keeps the best ones within max_tokens.
+
+    Returns:
+        list: Selected examples in their original order.
+    """
+    candidates = []
+    seen = set()
+    for idx, example in enumerate(example_questions or []):
+        example = " ".join(str(example).split())
+        if example and example.lower() not in seen:
+            seen.add(example.lower())
+            candidates.append((idx, example))
+
+    syllabus_words = _words(syllabus)
+    ranked = sorted(candidates, key=lambda c: -len(_words(c[1]) & syllabus_words))
+
+    selected = []
+    used = 0
+    for idx, example in ranked:
+        cost = estimate_tokens(example) + 3
+        if len(selected) >= max_examples or used + cost > max_tokens:
+            continue
+        selected.append((idx, example))
+        used += cost
+
+    return [example for _, example in sorted(selected)]
+
+
+def _questions_per_call(prompt_tokens, per_question, num_questions):
+    available = min(CONTEXT_WINDOW - SAFETY_MARGIN - prompt_tokens, MAX_COMPLETION_TOKENS)
+    return max(1, min(num_questions, MAX_QUESTIONS_PER_CALL, available // per_question))
+
+
+def plan_generation(instruction_tokens, syllabus, example_questions, num_questions,
+                    q_format, include_answers=False, marks_weightage=1):
+    """
+    Plans a question generation request so every call fits the context window.
+
+    Args:
+        instruction_tokens (int): Tokens used by the prompt template without syllabus and examples.
+
+    Returns:
+        dict: The compressed syllabus, selected examples and the per-call token budget.
+    """
+    compressed_syllabus = compress_syllabus(syllabus)
+    examples = select_examples(example_questions, compressed_syllabus)
+
+    syllabus_tokens = estimate_tokens(compressed_syllabus)
+    examples_tokens = sum(estimate_tokens(e) + 3 for e in examples)
+    # Room is reserved for the already-accepted questions that later calls list as exclusions
+    prompt_tokens = instruction_tokens + syllabus_tokens + examples_tokens + EXCLUSIONS_MAX_TOKENS
+
+    per_question = completion_tokens_per_question(q_format, include_answers, marks_weightage)
+    per_call = _questions_per_call(prompt_tokens, per_question, num_questions)
+
+    return {
+        "syllabus": compressed_syllabus,
+        "examples": examples,
+        "questions_per_call": per_call,
+        "num_calls": math.ceil(num_questions / per_call),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens_per_call": per_call * per_question,
+        "completion_tokens_per_question": per_question,
+        "syllabus_tokens": syllabus_tokens,
+        "syllabus_tokens_original": estimate_tokens(syllabus),
+        "examples_used": len(examples),
+        "examples_dropped": len([e for e in (example_questions or []) if str(e).strip()]) - len(examples),
+    }
+
+
+def fit_exclusions(questions, max_tokens=EXCLUSIONS_MAX_TOKENS):
+    """
+    Shortens already-accepted questions to their first line and keeps the most recent ones within max_tokens.
+
+    Returns:
+        list: Question stems in their original order.
+    """
+    kept = []
+    used = 0
+    for question in reversed(questions or []):
+        stem = " ".join(str(question).strip().split("\n")[0].split())[:200]
+        cost = estimate_tokens(stem) + 2
+        if not stem:
+            continue
+        if used + cost > max_tokens:
+            break
+        kept.append(stem)
+        used += cost
+    return list(reversed(kept))
+
+
+def _compact_document(text):
+    """Collapses whitespace and drops repeated lines such as PDF page headers and footers."""
+    lines = []
+    seen = set()
+    for line in (text or "").splitlines():
+        line = " ".join(line.split())
+        if not line:
+            continue
+        key = line.lower()
+        if key in seen and len(line) < 120:
+            continue
+        seen.add(key)
+        lines.append(line)
+    return lines
+
+
+def _take_lines(lines, max_tokens):
+    kept = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+def _sample_lines(lines, max_tokens, excerpts=SECTION_EXCERPTS):
+    """
+    Fits a run of lines into max_tokens by taking the opening lines of evenly spaced excerpts,
+    so a section samples its whole part of the document instead of only the beginning.
+    """
+    if sum(estimate_tokens(line) + 1 for line in lines) <= max_tokens:
+        return "\n".join(lines)
+
+    excerpts = max(1, min(excerpts, len(lines)))
+    size = math.ceil(len(lines) / excerpts)
+    kept = []
+    remaining = max_tokens
+    for i in range(excerpts):
+        # Budget an excerpt leaves unused carries over to the ones after it
+        taken = _take_lines(lines[i * size:(i + 1) * size], remaining // (excerpts - i))
+        remaining -= sum(estimate_tokens(line) + 1 for line in taken)
+        kept.extend(taken)
+    return "\n".join(kept)
+
+
+def plan_document(text, num_questions, instruction_tokens):
+    """
+    Plans quiz generation from a document so every call fits the context window.
+
+    Long documents are split into up to one part per call. A part larger than the section
+    budget is sampled with evenly spaced excerpts, so the calls draw on the whole document
+    but only document_coverage of its tokens reach the model.
+
+    Returns:
+        dict: The document sections (one per call), questions per call, token estimates
+        and document_coverage, the share of document tokens included in some section.
+    """
+    lines = _compact_document(text)
+    document_tokens = sum(estimate_tokens(line) + 1 for line in lines)
+    per_question = completion_tokens_per_question("pdf mcq")
+
+    # Reserve room for the completion of a full call before sizing the document section
+    reserve = min(num_questions, MAX_QUESTIONS_PER_CALL) * per_question
+    section_budget = min(DOCUMENT_MAX_TOKENS, CONTEXT_WINDOW - SAFETY_MARGIN - instruction_tokens - reserve)
+    section_budget = max(section_budget, 512)
+
+    per_call = _questions_per_call(instruction_tokens + min(document_tokens, section_budget), per_question, num_questions)
+    num_calls = math.ceil(num_questions / per_call)
+
+    # Split the document evenly across calls, then fit each part into the section budget
+    parts = max(1, min(num_calls, math.ceil(document_tokens / section_budget)))
+    size = math.ceil(len(lines) / parts) if lines else 0
+    sections = [_sample_lines(lines[i * size:(i + 1) * size], section_budget) for i in range(parts)]
+    text_tokens = estimate_tokens(text)
+    used_tokens = sum(estimate_tokens(s) for s in sections)
+
+    return {
+        "sections": sections,
+        "questions_per_call": per_call,
+        "num_calls": num_calls,
+        "prompt_tokens": instruction_tokens + max((estimate_tokens(s) for s in sections), default=0),
+        "completion_tokens_per_call": per_call * per_question,
+        "document_tokens": text_tokens,
+        "document_tokens_used": used_tokens,
+        "document_coverage": min(1.0, used_tokens / text_tokens) if text_tokens else 1.0,
+    }
@@ -1,12 +1,15 @@
 import os
 import re
-from database import get_db_connection
+import json
+from backend.database import get_db_connection
 import streamlit as st
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from backend.database import get_questions, insert_question
+from langchain.prompts import PromptTemplate
+from backend.database import get_questions, get_options_for_questions, get_bank_candidates, insert_question
+from backend.prompt_planner import estimate_tokens, plan_generation, plan_document, fit_exclusions, compress_syllabus
 
 # Load environment variables
 load_dotenv()
@@ -18,10 +21,20 @@ if not groq_api_key:
 # Initialize Language Model
 llm = ChatGroq(temperature=0.5, groq_api_key=groq_api_key, model_name="llama3-8b-8192")
 
-def generate_questions(subject_name, syllabus, num_questions, example_questions,
-                     difficulty, question_type, q_format, bloom_level,
-                     include_answers, marks_weightage):
-    few_shot_examples = "\n".join([f"Example {i+1}: {q}" for i, q in enumerate(example_questions)])
+# Extra calls allowed to request only the questions missing after the planned calls
+MAX_COMPLETION_ROUNDS = int(os.getenv("MAX_COMPLETION_ROUNDS", 2))
+
+# Stored questions fetched per requested question when choosing from the bank
+BANK_CANDIDATE_FACTOR = 5
+
+def _build_prompt(subject_name, syllabus, num_questions, examples, difficulty,
+                  q_format, bloom_level, include_answers, marks_weightage, exclusions=None):
+    few_shot_examples = "\n".join([f"Example {i+1}: {q}" for i, q in enumerate(examples)])
+    
+    exclusion_instruction = ""
+    if exclusions:
+        exclusion_instruction = "Do not repeat or rephrase any of these existing questions:\n" + \
+            "\n".join([f"- {q}" for q in exclusions])
     
     # Enhanced MCQ instruction
     mcq_instruction = ""
@@ -38,7 +51,10 @@ def generate_questions(subject_name, syllabus, num_questions, example_questions,
           d) 6
         """
 
-    prompt_template = f"""
+    option_lines = "" if q_format.lower() != "mcq" else "a) <option1>\nb) <option2>\nc) <option3>\nd) <option4>"
+    answer_line = "" if not include_answers else "Answer: <correct answer>"
+
+    return f"""
     Generate exactly {num_questions} {q_format} questions for {subject_name}.
     Syllabus: {syllabus}
     Difficulty: {difficulty}
@@ -49,20 +65,22 @@ def generate_questions(subject_name, syllabus, num_questions, example_questions,
     Examples:
     {few_shot_examples}
 
+    {exclusion_instruction}
+
     Format each question as:
     Q{{number}}: <question>
-    {"" if q_format.lower() != "mcq" else "a) <option1>\nb) <option2>\nc) <option3>\nd) <option4>"}
-    {"" if not include_answers else "Answer: <correct answer>"}
+    {option_lines}
+    {answer_line}
     """
 
-    response = llm.invoke(prompt_template).content.strip()
-    
-    # Debug output to console
-    print("\n=== FULL GENERATED OUTPUT ===")
-    print(response)
-    print("===========================\n")
+def _token_usage(response, prompt):
+    """Returns (prompt_tokens, completion_tokens), preferring the counts reported by the API."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None and usage.get("output_tokens") is not None:
+        return usage["input_tokens"], usage["output_tokens"]
+    return estimate_tokens(prompt), estimate_tokens(response.content)
 
-    # Process response
+def _parse_questions(response, q_format, include_answers):
     questions = []
     
     if q_format.lower() == "mcq":
@@ -84,13 +102,10 @@ def generate_questions(subject_name, syllabus, num_questions, example_questions,
             # Clean options by removing (Correct) marker
             clean_options = [opt.replace("(Correct)", "").strip() for opt in options]
             
-            # Format question with options as part of the text
-            question_with_options = f"{question}\n\nOptions:\n"
-            question_with_options += "\n".join([f"{chr(97+i)}) {opt}" for i, opt in enumerate(clean_options)])
-            
             question_data = {
                 "id": int(q_num),
-                "question": question_with_options,
+                "question": question.strip(),
+                "options": clean_options,
                 "type": "mcq",
                 "correct_answer": correct_answer,
                 "user_answer": None
@@ -145,30 +160,263 @@ def generate_questions(subject_name, syllabus, num_questions, example_questions,
 
     return questions
 
-def generate_quiz(subject, question_type, num_questions, difficulty):
-    """Generate quiz questions with proper error handling"""
+def _select_from_bank(rows, count, syllabus):
+    """
+    Pick up to count stored questions, unseen before seen, spread across syllabus topics.
+
+    Each candidate is assigned to the requested topic sharing the most words with it;
+    topics are then visited round-robin so no single topic dominates the selection.
+    """
+    topics = [set(re.findall(r"[a-z0-9]+", t.lower())) for t in compress_syllabus(syllabus).split(", ") if t]
+    
+    buckets = {}
+    for row in rows:
+        words = set(re.findall(r"[a-z0-9]+", f"{row['question']} {row['answer'] or ''}".lower()))
+        overlaps = [len(words & topic) for topic in topics]
+        if overlaps and max(overlaps) > 0:
+            topic = overlaps.index(max(overlaps))
+        else:
+            topic = (row.get("syllabus") or "").lower()
+        # Rows arrive unseen first, so each bucket keeps that order
+        buckets.setdefault(topic, []).append(row)
+    
+    selected = []
+    for seen_pass in (0, 1):
+        queues = [[r for r in bucket if r["seen"] == seen_pass] for bucket in buckets.values()]
+        while len(selected) < count and any(queues):
+            for queue in queues:
+                if queue and len(selected) < count:
+                    selected.append(queue.pop(0))
+    return selected
+
+def generate_questions(subject_name, syllabus, num_questions, example_questions,
+                     difficulty, question_type, q_format, bloom_level,
+                     include_answers, marks_weightage, bank_first=False, user_id=None):
+    questions = []
+    seen = set()
+    
+    # Serve as much of the request as possible from stored questions
+    if bank_first:
+        candidates = get_bank_candidates(
+            subject_name, difficulty, q_format, bloom_level, user_id,
+            limit=num_questions * BANK_CANDIDATE_FACTOR
+        )
+        for q in format_bank_questions(_select_from_bank(candidates, num_questions, syllabus)):
+            key = _question_key(q["question"])
+            if key and key not in seen:
+                seen.add(key)
+                q.update({"type": q_format.lower(), "source": "bank", "user_answer": None})
+                questions.append(q)
+    bank_hits = len(questions)
+    
+    # Size the prompt for the shortfall against the context window before calling the model
+    shortfall = num_questions - bank_hits
+    instruction_tokens = estimate_tokens(_build_prompt(
+        subject_name, "", shortfall, [], difficulty, q_format, bloom_level, include_answers, marks_weightage
+    ))
+    plan = plan_generation(
+        instruction_tokens, syllabus, example_questions, shortfall,
+        q_format, include_answers, marks_weightage
+    )
+
+    prompt_tokens = 0
+    completion_tokens = 0
+    calls = 0
+    completion_rounds = 0
+
+    # Run the planned calls, then up to MAX_COMPLETION_ROUNDS extra calls asking only for the shortfall
+    while len(questions) < num_questions:
+        if calls >= plan["num_calls"]:
+            if completion_rounds >= MAX_COMPLETION_ROUNDS:
+                break
+            completion_rounds += 1
+            print(f"⚠️ Parsed {len(questions)}/{num_questions} questions, requesting the missing {num_questions - len(questions)}")
+        batch_size = min(plan["questions_per_call"], num_questions - len(questions))
+        calls += 1
+
+        prompt_template = _build_prompt(
+            subject_name, plan["syllabus"], batch_size, plan["examples"], difficulty,
+            q_format, bloom_level, include_answers, marks_weightage,
+            exclusions=fit_exclusions([q["question"] for q in questions])
+        )
+        response = llm.invoke(prompt_template)
+        used_prompt, used_completion = _token_usage(response, prompt_template)
+        prompt_tokens += used_prompt
+        completion_tokens += used_completion
+        response = response.content.strip()
+        
+        # Debug output to console
+        print(f"\n=== FULL GENERATED OUTPUT (call {calls}) ===")
+        print(response)
+        print("===========================\n")
+
+        accepted = 0
+        for q in _parse_questions(response, q_format, include_answers):
+            key = _question_key(q["question"])
+            if accepted >= batch_size or not key or key in seen:
+                continue
+            seen.add(key)
+            questions.append(q)
+            accepted += 1
+
+    # Number questions sequentially across calls
+    for idx, q in enumerate(questions, 1):
+        q["id"] = idx
+
+    metrics = _build_metrics(
+        plan, num_questions, len(questions), prompt_tokens, completion_tokens,
+        generated=len(questions) - bank_hits,
+        calls=calls,
+        completion_rounds=completion_rounds,
+        bank_hits=bank_hits,
+        bank_hit_ratio=bank_hits / num_questions if num_questions else 0.0
+    )
+    return questions, metrics
+
+def _question_key(question):
+    """Normalized question stem used to detect duplicates across calls."""
+    stem = question.strip().split("\n")[0]
+    return " ".join(re.findall(r"[a-z0-9]+", stem.lower()))
+
+def _build_metrics(plan, requested, received, prompt_tokens, completion_tokens, generated=None, **extra):
+    """Token and yield numbers for one generation request."""
+    total_tokens = prompt_tokens + completion_tokens
+    generated = received if generated is None else generated
+    metrics = {
+        "requested": requested,
+        "received": received,
+        "yield": received / requested if requested else 0.0,
+        "calls": plan["num_calls"],
+        "questions_per_call": plan["questions_per_call"],
+        "planned_prompt_tokens": plan["prompt_tokens"],
+        "planned_completion_tokens": plan["completion_tokens_per_call"],
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "questions_per_1k_tokens": 1000 * generated / total_tokens if total_tokens else 0.0,
+        "tokens_per_question": total_tokens / generated if generated else float(total_tokens),
+    }
+    for key in ("syllabus_tokens", "syllabus_tokens_original", "examples_used", "examples_dropped",
+                "document_tokens", "document_tokens_used", "document_coverage"):
+        if key in plan:
+            metrics[key] = plan[key]
+    metrics.update(extra)
+    print(f"📊 Generation metrics: {metrics}")
+    return metrics
+
+def parse_quiz(response):
+    try:
+        response_text = response.content if hasattr(response, "content") else str(response)
+        response_text = response_text.strip().strip("json").strip("").strip()
+        quiz_data = json.loads(response_text)
+
+        if isinstance(quiz_data, list):
+            for q in quiz_data:
+                if 'correct_answer' in q and 'options' in q:
+                    if len(q['correct_answer']) == 1 and q['correct_answer'].isalpha():
+                        index = ord(q['correct_answer'].upper()) - ord('A')
+                        if 0 <= index < len(q['options']):
+                            q['correct_answer'] = q['options'][index]
+            
+            return quiz_data
+        else:
+            raise ValueError("Invalid quiz structure")
+
+    except (json.JSONDecodeError, ValueError) as e:
+        st.error(f"Failed to parse the generated quiz. Error: {str(e)}")
+        return None
+
+quiz_prompt = PromptTemplate(
+    input_variables=["text", "number", "subject", "tone"],
+    template=(
+        "You are an expert in creating MCQ quizzes.\n"
+        "Generate {number} multiple-choice questions for {subject} students in a {tone} tone.\n"
+        "Return only JSON with this structure:\n"
+        "[\n"
+        "  {{ 'question': '...', 'options': ['...', '...', '...', '...'], 'correct_answer': '...' }}\n"
+        "]\n\n"
+        "Ensure 'correct_answer' matches exactly one of the options.\n"
+        "Return ONLY the JSON output without any extra text.\n\n"
+        "Text:\n{text}"
+    )
+)
+
+def generate_quiz_from_pdf(text, number, subject, tone):
+    """Generate MCQs from document text, splitting long documents across calls that fit the context window"""
+    instruction_tokens = estimate_tokens(quiz_prompt.format(text="", number=number, subject=subject, tone=tone))
+    plan = plan_document(text, number, instruction_tokens)
+
+    quiz = []
+    prompt_tokens = 0
+    completion_tokens = 0
+
+    for call in range(plan["num_calls"]):
+        batch_size = min(plan["questions_per_call"], number - len(quiz))
+        if batch_size <= 0:
+            break
+
+        section = plan["sections"][call % len(plan["sections"])]
+        prompt = quiz_prompt.format(text=section, number=batch_size, subject=subject, tone=tone)
+        response = llm.invoke(prompt)
+        used_prompt, used_completion = _token_usage(response, prompt)
+        prompt_tokens += used_prompt
+        completion_tokens += used_completion
+
+        parsed = parse_quiz(response)
+        if parsed:
+            quiz.extend(parsed[:batch_size])
+
+    metrics = _build_metrics(plan, number, len(quiz), prompt_tokens, completion_tokens)
+    return quiz or None, metrics
+
+def split_question_options(question_text):
+    """
+    Splits a question stored with its options baked into the text ("Options:\na) ...")
+    into the question stem and the option list.
+    """
+    stem, marker, option_block = question_text.partition("\n\nOptions:\n")
+    if not marker:
+        return question_text, []
+    options = re.findall(r"^[a-d]\)\s*(.+)$", option_block, re.MULTILINE)
+    return stem.strip(), [opt.strip() for opt in options]
+
+def generate_quiz(subject, question_type, num_questions, difficulty, user_id=None):
+    """Generate quiz questions with proper error handling; a user_id gets questions they have not seen first"""
     try:
         # Use get_questions from database.py
-        questions = get_questions(subject, question_type, difficulty, num_questions)
+        questions = get_questions(subject, question_type, difficulty, num_questions, user_id)
         
         if not questions:
             st.warning(f"No questions found for {subject} with type {question_type} and difficulty {difficulty}")
             return []
         
-        # Format questions consistently
-        formatted_questions = []
-        for idx, q in enumerate(questions, 1):
-            formatted_q = {
-                "id": idx,
-                "question": q["question"],
-                "question_type": q["question_type"],
-                "difficulty": q["difficulty"],
-                "correct_answer": q["answer"]
-            }
-            formatted_questions.append(formatted_q)
-        
-        return formatted_questions
+        return format_bank_questions(questions)
         
     except Exception as e:
         st.error(f"Error generating quiz: {str(e)}")
-        return []
\ No newline at end of file
+        return []
+
+def format_bank_questions(questions):
+    """Format question rows from the database for quizzes, loading all their options in one query"""
+    options_by_question = get_options_for_questions([q["id"] for q in questions])
+    
+    formatted_questions = []
+    for idx, q in enumerate(questions, 1):
+        question_text = q["question"]
+        options = options_by_question.get(q["id"])
+        if not options:
+            # Questions saved before options were stored separately carry them in the text
+            question_text, options = split_question_options(question_text)
+        
+        formatted_q = {
+            "id": idx,
+            "db_id": q["id"],
+            "question": question_text,
+            "question_type": q["question_type"],
+            "difficulty": q["difficulty"],
+            "correct_answer": q["answer"]
+        }
+        if options:
+            formatted_q["options"] = options
+        formatted_questions.append(formatted_q)
+    
+    return formatted_questions
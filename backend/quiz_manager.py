@@ -1,4 +1,5 @@
 from backend.database import save_quiz_result
+from backend.answer_grader import grade_submission
 
 def process_quiz_submission(user_answers):
     """
@@ -10,25 +11,33 @@ def process_quiz_submission(user_answers):
     Returns:
         dict: {"score": int, "total": int, "results": list}
     """
-    from backend.database import get_questions
+    from backend.database import get_questions_by_ids
     
-    # Fetch all questions from DB (or optimize to fetch only required ones)
-    all_questions = get_questions()
-    question_map = {q["id"]: q["answer"] for q in all_questions}
+    # Fetch only the answered questions, in one query
+    question_map = {q["id"]: q for q in get_questions_by_ids(list(user_answers.keys()))}
+
+    question_ids = list(user_answers.keys())
+    questions = [question_map.get(qid, {}) for qid in question_ids]
+    graded = grade_submission(
+        [q.get("question", "") for q in questions],
+        [user_answers[qid] for qid in question_ids],
+        [q.get("answer", "") for q in questions],
+        [q.get("question_type", "") for q in questions]
+    )
 
     score = 0
     results = []
 
-    for qid, user_ans in user_answers.items():
-        correct_ans = question_map.get(qid, "").strip()
-        is_correct = user_ans.strip().lower() == correct_ans.lower()
+    for qid, q, grade in zip(question_ids, questions, graded):
+        is_correct = grade["is_correct"]
         score += 1 if is_correct else 0
         
         results.append({
             "question_id": qid,
-            "user_answer": user_ans,
-            "correct_answer": correct_ans,
-            "is_correct": is_correct
+            "user_answer": user_answers[qid],
+            "correct_answer": (q.get("answer") or "").strip(),
+            "is_correct": is_correct,
+            "similarity": grade["score"]
         })
 
     return {"score": score, "total": len(user_answers), "results": results}
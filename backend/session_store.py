@@ -0,0 +1,287 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Per-session limits
+MAX_SESSION_QUESTIONS = int(os.getenv("SESSION_MAX_QUESTIONS", 100))
+MAX_ANSWER_CHARS = int(os.getenv("SESSION_MAX_ANSWER_CHARS", 2000))
+MAX_DOCUMENT_CHARS = int(os.getenv("SESSION_MAX_DOCUMENT_CHARS", 200000))
+
+# Sessions not seen for this long are treated as abandoned and release their stored questions.
+# Questions that are not in the database cannot be reloaded, so they stay pinned until the
+# session has been gone for SESSION_ORPHAN_TTL_SECONDS.
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", 1800))
+SESSION_ORPHAN_TTL_SECONDS = int(os.getenv("SESSION_ORPHAN_TTL_SECONDS", 86400))
+EVICTION_INTERVAL_SECONDS = 60
+
+# Unpinned questions kept in the shared cache
+QUESTION_CACHE_SIZE = int(os.getenv("QUESTION_CACHE_SIZE", 5000))
+
+# Shared across every Streamlit session in this process
+_lock = threading.RLock()
+_questions = OrderedDict()  # key -> question dict, least recently used first
+_pins = {}                  # key -> number of session slots referencing it
+_sizes = {}                 # key -> approximate bytes held by the cached question
+_cache_bytes = 0            # sum of _sizes, kept up to date so reports never walk the cache
+_sessions = {}              # session_id -> {"last_seen": float, "slots": {slot: [key, ...]}}
+_last_eviction = 0.0
+
+
+def question_key(question):
+    """Stable handle for a question: its database id if stored, otherwise a content hash."""
+    if question.get("db_id") is not None:
+        return f"db:{question['db_id']}"
+    content = "\x1f".join([
+        str(question.get("question", "")),
+        "\x1e".join(question.get("options") or []),
+        str(question.get("correct_answer", "")),
+    ])
+    return "h:" + hashlib.sha1(content.encode("utf-8")).hexdigest()[:20]
+
+
+def _put(key, question, size):
+    # Called with _lock held; size is measured by the caller before taking the lock
+    global _cache_bytes
+    _cache_bytes += size - _sizes.get(key, 0)
+    _sizes[key] = size
+    _questions[key] = question
+    _questions.move_to_end(key)
+
+
+def _drop(key):
+    # Called with _lock held
+    global _cache_bytes
+    _cache_bytes -= _sizes.pop(key, 0)
+    del _questions[key]
+
+
+def _is_stored(key):
+    return key.startswith("db:")
+
+
+def _trim_cache():
+    # Called with _lock held; only questions no session references are evicted.
+    # Content-hashed questions are dropped by _unpin as soon as nothing references them.
+    unpinned = sum(1 for key in _questions if key not in _pins)
+    for key in list(_questions):
+        if unpinned <= QUESTION_CACHE_SIZE:
+            break
+        if key not in _pins:
+            _drop(key)
+            unpinned -= 1
+
+
+def _pin(keys):
+    for key in keys:
+        _pins[key] = _pins.get(key, 0) + 1
+
+
+def _unpin(keys):
+    for key in keys:
+        count = _pins.get(key, 0) - 1
+        if count > 0:
+            _pins[key] = count
+        else:
+            _pins.pop(key, None)
+            # Only database questions can be reloaded, so nothing else is left behind for the LRU
+            if not _is_stored(key) and key in _questions:
+                _drop(key)
+
+
+def touch(session_id):
+    """Records activity for a session and periodically evicts abandoned sessions."""
+    global _last_eviction
+    now = time.time()
+    with _lock:
+        session = _sessions.setdefault(session_id, {"last_seen": now, "slots": {}})
+        session["last_seen"] = now
+        session.pop("parked", None)
+        if now - _last_eviction >= EVICTION_INTERVAL_SECONDS:
+            _last_eviction = now
+            evict_abandoned(now)
+
+
+def store_questions(session_id, slot, questions):
+    """
+    Puts questions in the shared cache and returns compact handles for the session to keep.
+
+    Each session has named slots (e.g. "quiz", "pdf_quiz"); storing into a slot releases
+    the questions it held before. At most MAX_SESSION_QUESTIONS are kept per slot.
+    """
+    questions = list(questions)
+    if len(questions) > MAX_SESSION_QUESTIONS:
+        print(f"⚠️ Keeping {MAX_SESSION_QUESTIONS} of {len(questions)} questions in slot {slot} (SESSION_MAX_QUESTIONS)")
+    questions = [(question_key(q), q, _deep_size(q)) for q in questions[:MAX_SESSION_QUESTIONS]]
+    keys = []
+    with _lock:
+        session = _sessions.setdefault(session_id, {"last_seen": time.time(), "slots": {}})
+
+        for key, q, size in questions:
+            _put(key, q, size)
+            keys.append(key)
+
+        # Pin the new questions before releasing the old ones so shared content-hashed questions survive
+        _pin(keys)
+        _unpin(session["slots"].pop(slot, []))
+        session["slots"][slot] = keys
+        _trim_cache()
+    return keys
+
+
+def release_slot(session_id, slot):
+    """Releases the questions a session holds in one slot."""
+    with _lock:
+        session = _sessions.get(session_id)
+        if session:
+            _unpin(session["slots"].pop(slot, []))
+            _trim_cache()
+
+
+def release_session(session_id):
+    """Releases everything a session holds, e.g. when it is reset."""
+    with _lock:
+        session = _sessions.pop(session_id, None)
+        if session:
+            for keys in session["slots"].values():
+                _unpin(keys)
+            _trim_cache()
+
+
+def resolve(keys, session_id=None, slot=None):
+    """
+    Resolves handles back to question dicts.
+
+    When session_id and slot are given the keys are pinned again for that slot, so a session
+    that was evicted while idle gets its questions back and keeps them. Questions evicted from
+    the cache are reloaded from the database in one batch when they have a database id.
+    Content-hashed questions are only lost once their session has been gone for
+    SESSION_ORPHAN_TTL_SECONDS; they are returned as None.
+    """
+    keys = list(keys)
+    with _lock:
+        if session_id is not None and slot is not None:
+            session = _sessions.setdefault(session_id, {"last_seen": time.time(), "slots": {}})
+            if session["slots"].get(slot) != keys:
+                _pin(keys)
+                _unpin(session["slots"].get(slot, []))
+                session["slots"][slot] = keys
+        found = {key: _questions[key] for key in keys if key in _questions}
+        for key in found:
+            _questions.move_to_end(key)
+
+    missing = [int(key[3:]) for key in keys if key not in found and _is_stored(key)]
+    if missing:
+        from backend.database import get_questions_by_ids
+        from backend.question_generator import format_bank_questions
+        reloaded = [(question_key(q), q, _deep_size(q)) for q in format_bank_questions(get_questions_by_ids(missing))]
+        with _lock:
+            for key, q, size in reloaded:
+                _put(key, q, size)
+                found[key] = q
+            _trim_cache()
+
+    return [found.get(key) for key in keys]
+
+
+def encode_answer(question, answer):
+    """Stores option answers as their index and free-text answers truncated to MAX_ANSWER_CHARS."""
+    if answer is None:
+        return None
+    options = question.get("options") or (["True", "False"] if _is_true_false(question) else None)
+    if options and answer in options:
+        return options.index(answer)
+    return str(answer)[:MAX_ANSWER_CHARS]
+
+
+def decode_answer(question, stored):
+    """Turns an answer stored with encode_answer back into the answer text."""
+    if isinstance(stored, int):
+        options = question.get("options") or (["True", "False"] if _is_true_false(question) else [])
+        return options[stored] if 0 <= stored < len(options) else None
+    return stored
+
+
+def _is_true_false(question):
+    return str(question.get("question_type", "")).lower() == "true/false"
+
+
+def evict_abandoned(now=None):
+    """
+    Releases the questions of sessions idle for longer than SESSION_TTL_SECONDS. Returns the number evicted.
+
+    Database questions are unpinned and can be reloaded if the session comes back; content-hashed
+    questions stay pinned until the session has been idle for SESSION_ORPHAN_TTL_SECONDS.
+    """
+    now = now or time.time()
+    evicted = 0
+    with _lock:
+        for sid, session in list(_sessions.items()):
+            idle = now - session["last_seen"]
+            if idle > SESSION_ORPHAN_TTL_SECONDS:
+                for keys in _sessions.pop(sid)["slots"].values():
+                    _unpin(keys)
+                evicted += 1
+            elif idle > SESSION_TTL_SECONDS and not session.get("parked"):
+                # Keep only what cannot be reloaded; resolve() pins the rest again on return
+                for slot, keys in session["slots"].items():
+                    _unpin([key for key in keys if _is_stored(key)])
+                    session["slots"][slot] = [key for key in keys if not _is_stored(key)]
+                session["parked"] = True
+                evicted += 1
+        if evicted:
+            _trim_cache()
+            print(f"🧹 Evicted {evicted} abandoned sessions")
+    return evicted
+
+
+def _deep_size(obj, seen=None):
+    """Approximate memory held by an object, following containers."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(item, seen) for item in obj)
+    return size
+
+
+def session_report(session_state, session_id=None):
+    """
+    Reports the approximate memory used by one session and by the shared question cache.
+
+    Returns:
+        dict: {"session_bytes", "entries": {name: bytes}, "session_questions", "cache": {...}}
+    """
+    entries = {}
+    for name in list(session_state.keys()):
+        try:
+            entries[str(name)] = _deep_size(session_state[name])
+        except Exception:
+            continue
+
+    with _lock:
+        session = _sessions.get(session_id, {"slots": {}})
+        cache = {
+            "questions": len(_questions),
+            "pinned": len(_pins),
+            "sessions": len(_sessions),
+            "bytes": _cache_bytes,
+        }
+        session_questions = sum(len(keys) for keys in session["slots"].values())
+
+    return {
+        "session_bytes": sum(entries.values()),
+        "entries": dict(sorted(entries.items(), key=lambda e: -e[1])),
+        "session_questions": session_questions,
+        "cache": cache,
+    }
@@ -17,5 +17,28 @@ CREATE TABLE IF NOT EXISTS questions (
     answer TEXT,
     difficulty VARCHAR(50) NOT NULL,
     question_type VARCHAR(50) NOT NULL,
-    bloom_level VARCHAR(50) NOT NULL
+    bloom_level VARCHAR(50) NOT NULL,
+    syllabus TEXT,
+    INDEX idx_questions_lookup (subject, question_type, difficulty),
+    FULLTEXT INDEX ft_questions (question, answer, syllabus)
+);
+
+-- 5️⃣ Create the MCQ Options Table
+CREATE TABLE IF NOT EXISTS question_options (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    question_id INT NOT NULL,
+    option_index INT NOT NULL,
+    option_text TEXT NOT NULL,
+    is_correct BOOLEAN NOT NULL DEFAULT FALSE,
+    UNIQUE INDEX idx_question_options (question_id, option_index),
+    FOREIGN KEY (question_id) REFERENCES questions (id) ON DELETE CASCADE
+);
+
+-- 6️⃣ Create the Question Exposure Table (which questions each user has already seen)
+CREATE TABLE IF NOT EXISTS question_exposures (
+    user_id VARCHAR(50) NOT NULL,
+    question_id INT NOT NULL,
+    seen_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, question_id),
+    FOREIGN KEY (question_id) REFERENCES questions (id) ON DELETE CASCADE
 );
@@ -0,0 +1,440 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Operators that switch a search query from relevance ranking to boolean matching
+BOOLEAN_QUERY = re.compile(r'(^|\s)[+\-"]|\*(\s|$)')
+
+
+class StorageBackend:
+    """
+    Base class for the database backends used by backend/database.py.
+
+    Queries in database.py are written with %s placeholders; each backend translates
+    them with sql() and supplies its own connection handling, schema and full-text search.
+    """
+    name = "base"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # opened/open count physical connections, active/peak count connections handed out by connect()
+        self.stats = {
+            "connections_opened": 0, "connections_open": 0,
+            "connections_active": 0, "connections_peak": 0,
+        }
+
+    def _opened(self):
+        with self._lock:
+            self.stats["connections_opened"] += 1
+            self.stats["connections_open"] += 1
+
+    def _closed(self):
+        with self._lock:
+            self.stats["connections_open"] -= 1
+
+    def _checked_out(self):
+        with self._lock:
+            self.stats["connections_active"] += 1
+            self.stats["connections_peak"] = max(self.stats["connections_peak"], self.stats["connections_active"])
+
+    def _checked_in(self):
+        with self._lock:
+            self.stats["connections_active"] -= 1
+
+    def connect(self):
+        """Returns a connection for one unit of work."""
+        raise NotImplementedError
+
+    def release(self, conn):
+        """Hands a connection obtained from connect() back to the backend."""
+        raise NotImplementedError
+
+    def dict_cursor(self, conn):
+        """Returns a cursor whose rows are dictionaries keyed by column name."""
+        raise NotImplementedError
+
+    def sql(self, query):
+        """Translates a query written with %s placeholders (and MySQL's INSERT IGNORE) into this backend's dialect."""
+        return query
+
+    def inserted_ids(self, cursor, count):
+        """Returns the ids of the count rows just inserted by one executemany() on cursor."""
+        raise NotImplementedError
+
+    def initialize(self):
+        """Creates tables and indexes that do not exist yet."""
+        raise NotImplementedError
+
+    def search_query(self, query, subject=None, question_type=None, limit=20, offset=0):
+        """Returns (sql, params) for a ranked full-text search over the questions table."""
+        raise NotImplementedError
+
+
+class MySQLBackend(StorageBackend):
+    """MySQL server backend; opens a new connection per unit of work."""
+    name = "mysql"
+
+    def connect(self):
+        import mysql.connector
+        conn = mysql.connector.connect(
+            host=os.getenv("MYSQL_HOST"),
+            user=os.getenv("MYSQL_USER"),
+            password=os.getenv("MYSQL_PASSWORD"),
+            database=os.getenv("MYSQL_DATABASE"),
+            port=int(os.getenv("MYSQL_PORT", 3306))
+        )
+        self._opened()
+        self._checked_out()
+        return conn
+
+    def release(self, conn):
+        conn.close()
+        self._closed()
+        self._checked_in()
+
+    def dict_cursor(self, conn):
+        return conn.cursor(dictionary=True)
+
+    def inserted_ids(self, cursor, count):
+        # executemany() sends one multi-row INSERT; lastrowid is the id of its first row, and InnoDB
+        # allocates a simple insert's auto-increment values as one consecutive block
+        first = cursor.lastrowid
+        return list(range(first, first + count))
+
+    def _has_index(self, cursor, table, index):
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        """, (table, index))
+        return cursor.fetchone()[0] > 0
+
+    def initialize(self):
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS questions (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                subject VARCHAR(255) NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT,
+                difficulty VARCHAR(50) NOT NULL,
+                question_type VARCHAR(50) NOT NULL,
+                bloom_level VARCHAR(50) NOT NULL,
+                syllabus TEXT,
+                INDEX idx_questions_lookup (subject, question_type, difficulty),
+                FULLTEXT INDEX ft_questions (question, answer, syllabus)
+            )
+        """)
+
+        # Upgrade tables created before syllabus storage and full-text search existed
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'questions' AND COLUMN_NAME = 'syllabus'
+        """)
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("ALTER TABLE questions ADD COLUMN syllabus TEXT")
+
+        if not self._has_index(cursor, "questions", "ft_questions"):
+            cursor.execute("ALTER TABLE questions ADD FULLTEXT INDEX ft_questions (question, answer, syllabus)")
+        if not self._has_index(cursor, "questions", "idx_questions_lookup"):
+            cursor.execute("CREATE INDEX idx_questions_lookup ON questions (subject, question_type, difficulty)")
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS quiz_results (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id VARCHAR(50) NOT NULL,
+                quiz_id VARCHAR(50) NOT NULL,
+                score INT NOT NULL,
+                total_questions INT NOT NULL,
+                percentage FLOAT NOT NULL,
+                INDEX idx_quiz_results_user (user_id)
+            )
+        """)
+        if not self._has_index(cursor, "quiz_results", "idx_quiz_results_user"):
+            cursor.execute("CREATE INDEX idx_quiz_results_user ON quiz_results (user_id)")
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS question_options (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                question_id INT NOT NULL,
+                option_index INT NOT NULL,
+                option_text TEXT NOT NULL,
+                is_correct BOOLEAN NOT NULL DEFAULT FALSE,
+                UNIQUE INDEX idx_question_options (question_id, option_index),
+                FOREIGN KEY (question_id) REFERENCES questions (id) ON DELETE CASCADE
+            )
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS question_exposures (
+                user_id VARCHAR(50) NOT NULL,
+                question_id INT NOT NULL,
+                seen_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, question_id),
+                FOREIGN KEY (question_id) REFERENCES questions (id) ON DELETE CASCADE
+            )
+        """)
+
+        conn.commit()
+        cursor.close()
+        self.release(conn)
+
+    def search_query(self, query, subject=None, question_type=None, limit=20, offset=0):
+        mode = "IN BOOLEAN MODE" if BOOLEAN_QUERY.search(query) else "IN NATURAL LANGUAGE MODE"
+        match = f"MATCH(question, answer, syllabus) AGAINST (%s {mode})"
+
+        filters = [match]
+        params = [query]
+        if subject:
+            filters.append("subject = %s")
+            params.append(subject)
+        if question_type:
+            filters.append("question_type = %s")
+            params.append(question_type)
+
+        sql = f"""
+            SELECT id, subject, question, answer, difficulty, question_type, bloom_level, syllabus,
+                   {match} AS score
+            FROM questions
+            WHERE {" AND ".join(filters)}
+            ORDER BY score DESC
+            LIMIT %s OFFSET %s
+        """
+        return sql, [query] + params + [int(limit), int(offset)]
+
+
+def _dict_row(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Embedded SQLite backend for single-node deployments.
+
+    Connections run in WAL mode, so readers never block the writer, and are kept in a
+    bounded pool so repeated queries are served from each connection's prepared statement
+    cache. Streamlit runs every rerun on a new thread, so connections are not tied to threads:
+    connect() checks one out and release() puts it back.
+    """
+    name = "sqlite"
+
+    PRAGMAS = (
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA foreign_keys = ON",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -65536",
+        "PRAGMA mmap_size = 268435456",
+        "PRAGMA busy_timeout = 5000",
+    )
+
+    def __init__(self, path=None):
+        super().__init__()
+        self.path = path or os.getenv("SQLITE_PATH", "exam_generator.db")
+        self.pool_size = int(os.getenv("SQLITE_POOL_SIZE", 8))
+        self.pool_timeout = float(os.getenv("SQLITE_POOL_TIMEOUT", 30))
+        # Most recently returned first, so the warmest statement caches are reused
+        self._pool = queue.LifoQueue()
+        self._size = 0
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=5.0, cached_statements=512, check_same_thread=False)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        self._opened()
+        return conn
+
+    def connect(self):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._size < self.pool_size
+                if grow:
+                    self._size += 1
+            if grow:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                    raise
+            else:
+                try:
+                    conn = self._pool.get(timeout=self.pool_timeout)
+                except queue.Empty:
+                    raise TimeoutError(
+                        f"Error: No SQLite connection became free within {self.pool_timeout:g}s "
+                        f"(SQLITE_POOL_SIZE={self.pool_size})"
+                    )
+        self._checked_out()
+        return conn
+
+    def release(self, conn):
+        # End any transaction left behind so the next user starts clean
+        if conn.in_transaction:
+            conn.rollback()
+        self._checked_in()
+        self._pool.put(conn)
+
+    def close(self):
+        """Closes the pooled connections that are not checked out."""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._size -= 1
+            self._closed()
+
+    def dict_cursor(self, conn):
+        cursor = conn.cursor()
+        cursor.row_factory = _dict_row
+        return cursor
+
+    def inserted_ids(self, cursor, count):
+        # The open write transaction excludes other writers, so the rows got consecutive ids ending here
+        cursor.execute("SELECT last_insert_rowid()")
+        last = cursor.fetchone()[0]
+        return list(range(last - count + 1, last + 1))
+
+    def sql(self, query):
+        return query.replace("%s", "?").replace("INSERT IGNORE", "INSERT OR IGNORE")
+
+    def initialize(self):
+        conn = self.connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                subject TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT,
+                difficulty TEXT NOT NULL,
+                question_type TEXT NOT NULL,
+                bloom_level TEXT NOT NULL,
+                syllabus TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_questions_lookup ON questions (subject, question_type, difficulty);
+
+            CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+                question, answer, syllabus,
+                content = 'questions', content_rowid = 'id', tokenize = 'porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions BEGIN
+                INSERT INTO questions_fts (rowid, question, answer, syllabus)
+                VALUES (new.id, new.question, new.answer, new.syllabus);
+            END;
+            CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions BEGIN
+                INSERT INTO questions_fts (questions_fts, rowid, question, answer, syllabus)
+                VALUES ('delete', old.id, old.question, old.answer, old.syllabus);
+            END;
+            CREATE TRIGGER IF NOT EXISTS questions_fts_update AFTER UPDATE ON questions BEGIN
+                INSERT INTO questions_fts (questions_fts, rowid, question, answer, syllabus)
+                VALUES ('delete', old.id, old.question, old.answer, old.syllabus);
+                INSERT INTO questions_fts (rowid, question, answer, syllabus)
+                VALUES (new.id, new.question, new.answer, new.syllabus);
+            END;
+
+            CREATE TABLE IF NOT EXISTS quiz_results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                quiz_id TEXT NOT NULL,
+                score INTEGER NOT NULL,
+                total_questions INTEGER NOT NULL,
+                percentage REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_quiz_results_user ON quiz_results (user_id);
+
+            CREATE TABLE IF NOT EXISTS question_options (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question_id INTEGER NOT NULL REFERENCES questions (id) ON DELETE CASCADE,
+                option_index INTEGER NOT NULL,
+                option_text TEXT NOT NULL,
+                is_correct INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_question_options ON question_options (question_id, option_index);
+
+            CREATE TABLE IF NOT EXISTS question_exposures (
+                user_id TEXT NOT NULL,
+                question_id INTEGER NOT NULL REFERENCES questions (id) ON DELETE CASCADE,
+                seen_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, question_id)
+            ) WITHOUT ROWID;
+        """)
+        conn.commit()
+        self.release(conn)
+
+    @staticmethod
+    def _fts_query(query):
+        """Translates the MySQL-style search syntax accepted by the UI into an FTS5 expression."""
+        terms = re.findall(r'([+\-]?)("([^"]+)"|\S+)', query)
+        if not BOOLEAN_QUERY.search(query):
+            words = re.findall(r"\w+", query)
+            return " OR ".join(f'"{w}"' for w in words)
+
+        required, optional, excluded = [], [], []
+        for op, token, phrase in terms:
+            if phrase:
+                expr = '"' + " ".join(re.findall(r"\w+", phrase)) + '"'
+            else:
+                words = re.findall(r"\w+", token)
+                if not words:
+                    continue
+                expr = '"' + " ".join(words) + '"' + ("*" if token.endswith("*") else "")
+            {"+": required, "-": excluded}.get(op, optional).append(expr)
+
+        parts = list(required)
+        if optional:
+            parts.append("(" + " OR ".join(optional) + ")" if required else " OR ".join(optional))
+        if not parts:
+            return ""
+        expression = " AND ".join(parts)
+        for expr in excluded:
+            expression += f" NOT {expr}"
+        return expression
+
+    def search_query(self, query, subject=None, question_type=None, limit=20, offset=0):
+        expression = self._fts_query(query)
+        # A query with only exclusions or no words cannot match anything
+        filters = ["questions_fts MATCH ?" if expression else "0"]
+        params = [expression] if expression else []
+        if subject:
+            filters.append("q.subject = ?")
+            params.append(subject)
+        if question_type:
+            filters.append("q.question_type = ?")
+            params.append(question_type)
+
+        sql = f"""
+            SELECT q.id, q.subject, q.question, q.answer, q.difficulty, q.question_type,
+                   q.bloom_level, q.syllabus, -bm25(questions_fts) AS score
+            FROM questions_fts
+            JOIN questions q ON q.id = questions_fts.rowid
+            WHERE {" AND ".join(filters)}
+            ORDER BY bm25(questions_fts)
+            LIMIT ? OFFSET ?
+        """
+        return sql, params + [int(limit), int(offset)]
+
+
+BACKENDS = {
+    "mysql": MySQLBackend,
+    "sqlite": SQLiteBackend,
+}
+
+
+def get_backend(name=None):
+    """Returns the backend selected by DB_BACKEND (mysql or sqlite)."""
+    name = (name or os.getenv("DB_BACKEND", "mysql")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Error: Unknown DB_BACKEND '{name}'. Use one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
@@ -1,52 +1,117 @@
 import sys
 import os
 import streamlit as st
-import json
 import PyPDF2
 import traceback
-from langchain.prompts import PromptTemplate
-from langchain.schema.runnable import RunnableLambda
-from langchain_groq import ChatGroq
+import uuid
 from dotenv import load_dotenv
 
 load_dotenv()
-groq_api_key = os.getenv("GROQ_API_KEY")
-llm = ChatGroq(temperature=0.5, groq_api_key=groq_api_key, model_name="llama3-8b-8192")
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from backend.quiz_manager import process_quiz_submission
-from backend.question_generator import generate_quiz, generate_questions
+from backend.question_generator import generate_quiz, generate_questions, generate_quiz_from_pdf
 from backend.feedback_generator import generate_feedback
-from backend.database import insert_question
+from backend.answer_grader import grade_submission, warm_up
+from backend.database import insert_bulk_questions, search_questions, record_exposures
+from backend import session_store
 
 st.title("Exam & Quiz System")
 
+# Load the grading model in the background so the first submission does not wait for it
+warm_up()
+
+def get_session_id():
+    """Per-browser-session handle used to pin questions in the shared cache"""
+    if "session_handle" not in st.session_state:
+        st.session_state.session_handle = uuid.uuid4().hex
+    return st.session_state.session_handle
+
+def resolve_questions(keys, slot):
+    """Resolve question handles held in a session slot, or return None if the questions are no longer available"""
+    questions = session_store.resolve(keys, get_session_id(), slot)
+    if any(q is None for q in questions):
+        st.warning("This quiz has expired. Please start a new one.")
+        return None
+    return questions
+
 def display_generated_questions():
-    if "questions_with_answers" in st.session_state:
+    if "generated_keys" in st.session_state:
         st.subheader("Generated Questions")
         
-        for q in st.session_state.questions_with_answers:
-            with st.expander(f"Q{q['id']}", expanded=False):
+        questions = resolve_questions(st.session_state.generated_keys, "generated") or []
+        for idx, q in enumerate(questions, 1):
+            with st.expander(f"Q{idx}", expanded=False):
                 st.markdown(q["question"])
+                if q.get("options"):
+                    st.markdown("\n".join(f"{chr(97+i)}) {opt}  " for i, opt in enumerate(q["options"])))
                 if st.session_state.include_answers and q.get("correct_answer"):
                     st.markdown(f"Correct Answer: {q['correct_answer']}")
 
+def display_generation_metrics():
+    """Show token budget and yield numbers for the last generation request"""
+    metrics = st.session_state.get("generation_metrics")
+    if metrics:
+        with st.sidebar.expander("Generation Metrics", expanded=False):
+            st.metric("Questions received", f"{metrics['received']}/{metrics['requested']}")
+            st.metric("Questions per 1k tokens", f"{metrics['questions_per_1k_tokens']:.2f}")
+            if "bank_hit_ratio" in metrics:
+                st.metric("Bank hit ratio", f"{metrics['bank_hit_ratio']:.0%}")
+            if "document_coverage" in metrics:
+                st.metric("Document coverage", f"{metrics['document_coverage']:.0%}")
+            st.json(metrics)
+
+def display_session_memory():
+    """Show the approximate memory held by this session and the shared question cache"""
+    with st.sidebar.expander("Session Memory", expanded=False):
+        report = session_store.session_report(st.session_state, get_session_id())
+        st.metric("This session", f"{report['session_bytes'] / 1024:.1f} KiB")
+        st.metric("Shared cache", f"{report['cache']['bytes'] / 1024:.1f} KiB")
+        st.json(report)
+
+def grade_quiz(questions):
+    """Grade the submitted quiz once and keep only the per-question verdicts, so reruns do not re-grade"""
+    quiz_data = st.session_state.quiz
+    user_answers = [
+        session_store.decode_answer(q, quiz_data['answers'].get(str(idx)))
+        for idx, q in enumerate(questions)
+    ]
+    
+    # Grade the whole submission in one batch
+    graded = grade_submission(
+        [q['question'] for q in questions],
+        user_answers,
+        [q.get('correct_answer') for q in questions],
+        [q.get('question_type', '') for q in questions]
+    )
+    quiz_data['grades'] = [
+        {"is_correct": grade['is_correct'], "score": round(grade['score'], 3)} for grade in graded
+    ]
+
 def display_quiz_results():
     """Display quiz results after submission"""
     st.subheader("Quiz Results")
     
     quiz_data = st.session_state.quiz
+    questions = resolve_questions(quiz_data['keys'], "quiz")
+    if questions is None:
+        return
+    if 'grades' not in quiz_data:
+        grade_quiz(questions)
+    user_answers = [
+        session_store.decode_answer(q, quiz_data['answers'].get(str(idx)))
+        for idx, q in enumerate(questions)
+    ]
     score = 0
     
-    for q in quiz_data['questions']:
-        user_answer = quiz_data['answers'].get(str(q['id']))
+    for idx, (q, user_answer, grade) in enumerate(zip(questions, user_answers, quiz_data['grades']), 1):
         correct_answer = q.get('correct_answer', "No correct answer provided")
         
-        is_correct = str(user_answer).strip().lower() == str(correct_answer).strip().lower()
+        is_correct = grade['is_correct']
         if is_correct:
             score += 1
         
-        with st.expander(f"Question {q['id']}", expanded=False):
+        with st.expander(f"Question {idx}", expanded=False):
             st.markdown(q['question'])
             st.markdown(f"Your answer: {user_answer if user_answer is not None else 'No answer provided'}")
             st.markdown(f"Correct answer: {correct_answer}")
@@ -55,53 +120,13 @@ def display_quiz_results():
             else:
                 st.error("Incorrect")
     
-    st.success(f"Final Score: {score}/{len(quiz_data['questions'])}")
+    st.success(f"Final Score: {score}/{len(questions)}")
     
     if st.button("Start New Quiz"):
+        session_store.release_session(get_session_id())
         st.session_state.clear()
         st.rerun()
 
-def parse_quiz(response):
-    try:
-        response_text = response.content if hasattr(response, "content") else str(response)
-        response_text = response_text.strip().strip("json").strip("").strip()
-        quiz_data = json.loads(response_text)
-
-        if isinstance(quiz_data, list):
-            for q in quiz_data:
-                if 'correct_answer' in q and 'options' in q:
-                    if len(q['correct_answer']) == 1 and q['correct_answer'].isalpha():
-                        index = ord(q['correct_answer'].upper()) - ord('A')
-                        if 0 <= index < len(q['options']):
-                            q['correct_answer'] = q['options'][index]
-            
-            return quiz_data
-        else:
-            raise ValueError("Invalid quiz structure")
-
-    except (json.JSONDecodeError, ValueError) as e:
-        st.error(f"Failed to parse the generated quiz. Error: {str(e)}")
-        return None
-
-def generate_quiz_from_pdf(text, number, subject, tone):
-    quiz_prompt = PromptTemplate(
-        input_variables=["text", "number", "subject", "tone"],
-        template=(
-            "You are an expert in creating MCQ quizzes.\n"
-            "Generate {number} multiple-choice questions for {subject} students in a {tone} tone.\n"
-            "Return only JSON with this structure:\n"
-            "[\n"
-            "  {{ 'question': '...', 'options': ['...', '...', '...', '...'], 'correct_answer': '...' }}\n"
-            "]\n\n"
-            "Ensure 'correct_answer' matches exactly one of the options.\n"
-            "Return ONLY the JSON output without any extra text.\n\n"
-            "Text:\n{text}"
-        )
-    )
-
-    quiz_chain = quiz_prompt | llm | RunnableLambda(parse_quiz)
-    return quiz_chain.invoke({"text": text, "number": number, "subject": subject, "tone": tone})
-
 # Initialize session state
 if "quiz_questions" not in st.session_state:
     st.session_state.quiz_questions = []
@@ -110,15 +135,24 @@ if "user_answers" not in st.session_state:
 if "include_answers" not in st.session_state:
     st.session_state.include_answers = False
 
+session_store.touch(get_session_id())
+
 # Sidebar mode selection
-mode = st.sidebar.radio("Choose Mode", ["Generate Questions", "Take Quiz", "Upload PDF"])
+mode = st.sidebar.radio("Choose Mode", ["Generate Questions", "Take Quiz", "Upload PDF", "Search Bank"])
+# Seen questions are only tracked for an explicit user, so anonymous sessions leave no rows behind.
+# Only quizzes and bank-first generation use it, so the field is not shown in the other modes.
+user_id = None
+if mode in ("Generate Questions", "Take Quiz"):
+    user_id = st.sidebar.text_input(
+        "User ID", "", help="Enter your ID to get questions you have not seen before"
+    ).strip()[:50] or None
 
 # ========== Generate Questions Mode ==========
 if mode == "Generate Questions":
     # Sidebar Inputs
     subject_name = st.sidebar.text_input("Subject Name", "Computer Networks")
     syllabus = st.sidebar.text_area("Syllabus", "TCP Protocol, Three-way Handshake, Checksum")
-    num_questions = st.sidebar.slider("Number of Questions", 1, 100, 3)
+    num_questions = st.sidebar.slider("Number of Questions", 1, min(100, session_store.MAX_SESSION_QUESTIONS), 3)
     difficulty = st.sidebar.selectbox("Difficulty", ["Easy", "Medium", "Hard"])
     q_format = st.sidebar.selectbox("Question Format", ["MCQ", "Short Answer", "True/False"])
     st.session_state.include_answers = st.sidebar.checkbox("Include Answers?", True)
@@ -127,39 +161,50 @@ if mode == "Generate Questions":
     bloom_level = st.sidebar.selectbox(
         "Bloom's Taxonomy Level", ["Remembering", "Understanding", "Applying", "Analyzing", "Evaluating", "Creating"]
     )
+    bank_first = st.sidebar.checkbox("Reuse questions from the bank first", False)
 
     if st.sidebar.button("Generate Questions"):
         if subject_name and syllabus:
             with st.spinner("Generating questions..."):
                 try:
-                    questions = generate_questions(
+                    questions, metrics = generate_questions(
                         subject_name, syllabus, num_questions, example_questions,
                         difficulty, "Conceptual", q_format, bloom_level, 
-                        st.session_state.include_answers, marks_weightage
+                        st.session_state.include_answers, marks_weightage,
+                        bank_first=bank_first, user_id=user_id
                     )
+                    st.session_state.generation_metrics = metrics
                     
                     if questions:
-                        st.session_state.questions_with_answers = questions
-                        st.success(f"Generated {len(questions)} questions!")
+                        bank_hits = metrics.get("bank_hits", 0)
+                        st.success(f"Generated {len(questions)} questions ({bank_hits} reused from the bank)!")
                         
-                        # Store in database
-                        for q in questions:
-                            try:
-                                answer = q.get('correct_answer', '').strip()
-                                
-                                insert_question(
-                                    subject=subject_name,
-                                    question=q['question'].strip(),
-                                    answer=answer,
-                                    difficulty=difficulty,
-                                    question_type=q_format,
-                                    bloom_level=bloom_level
-                                )
-                                print(f"✅ Inserted question: {q['question']} with answer: {answer}")
-                            except Exception as e:
-                                st.error(f"Error saving question: {str(e)}")
-                                print(f"❌ Error saving question: {str(e)}")
-                                continue
+                        # Store newly generated questions and their options in one transaction
+                        new_questions = [q for q in questions if q.get("source") != "bank"]
+                        try:
+                            question_ids = insert_bulk_questions([
+                                {
+                                    "subject": subject_name,
+                                    "question": q['question'].strip(),
+                                    "answer": q.get('correct_answer', '').strip(),
+                                    "difficulty": difficulty,
+                                    "question_type": q_format,
+                                    "bloom_level": bloom_level,
+                                    "syllabus": syllabus,
+                                    "options": q.get('options')
+                                }
+                                for q in new_questions
+                            ])
+                            for q, question_id in zip(new_questions, question_ids):
+                                q["db_id"] = question_id
+                        except Exception as e:
+                            st.error(f"Error saving questions: {str(e)}")
+                            print(f"❌ Error saving questions: {str(e)}")
+                        
+                        # Keep only handles in the session; the questions live in the shared cache
+                        st.session_state.generated_keys = session_store.store_questions(
+                            get_session_id(), "generated", questions
+                        )
                     else:
                         st.error("No questions were generated. Please try different parameters.")
                 except Exception as e:
@@ -167,8 +212,9 @@ if mode == "Generate Questions":
                     print(f"❌ Error generating questions: {str(e)}")
 
     # Display questions with answers
-    if "questions_with_answers" in st.session_state and st.session_state.questions_with_answers:
+    if st.session_state.get("generated_keys"):
         display_generated_questions()
+    display_generation_metrics()
 
 # ========== Take Quiz Mode ==========
 elif mode == "Take Quiz":
@@ -195,7 +241,7 @@ elif mode == "Take Quiz":
             'started': False,
             'current_index': 0,
             'answers': {},
-            'questions': []
+            'keys': []
         }
 
     if st.sidebar.button("Start Quiz") and not st.session_state.quiz['started']:
@@ -205,15 +251,18 @@ elif mode == "Take Quiz":
                     subject_name,
                     question_type,
                     num_questions,
-                    difficulty
+                    difficulty,
+                    user_id=user_id
                 )
                 
                 if quiz_questions:
+                    if user_id:
+                        record_exposures(user_id, [q.get("db_id") for q in quiz_questions])
                     st.session_state.quiz = {
                         'started': True,
                         'current_index': 0,
-                        'answers': {str(q.get('id', idx)): None for idx, q in enumerate(quiz_questions)},
-                        'questions': quiz_questions
+                        'answers': {},
+                        'keys': session_store.store_questions(get_session_id(), "quiz", quiz_questions)
                     }
                 else:
                     st.error("Could not generate quiz. Please try different parameters.")
@@ -223,20 +272,23 @@ elif mode == "Take Quiz":
     if st.session_state.quiz.get('started'):
         try:
             current_idx = st.session_state.quiz['current_index']
-            questions = st.session_state.quiz['questions']
+            questions = resolve_questions(st.session_state.quiz['keys'], "quiz")
+            if questions is None:
+                st.session_state.quiz['started'] = False
+                st.stop()
             current_q = questions[current_idx]
             
             st.subheader(f"Question {current_idx + 1} of {len(questions)}")
             st.markdown(current_q.get('question'))
             
             # Handle different question types
-            if question_type == "MCQ" and 'options' in current_q:
+            if question_type == "MCQ" and current_q.get('options'):
                 # Display as radio buttons for MCQs
                 options = current_q['options']
                 answer = st.radio(
                     "Select your answer:",
                     options,
-                    key=f"q_{current_q.get('id', current_idx)}",
+                    key=f"q_{current_idx}",
                     index=None
                 )
             elif question_type == "True/False":
@@ -244,32 +296,38 @@ elif mode == "Take Quiz":
                 answer = st.radio(
                     "Select your answer:",
                     ["True", "False"],
-                    key=f"q_{current_q.get('id', current_idx)}",
+                    key=f"q_{current_idx}",
                     index=None
                 )
             else:
                 # Display as text input for short answers
                 answer = st.text_input(
                     "Your answer:",
-                    key=f"q_{current_q.get('id', current_idx)}"
+                    key=f"q_{current_idx}"
                 )
             
             col1, col2 = st.columns(2)
             with col1:
                 if current_idx > 0 and st.button("Previous"):
-                    st.session_state.quiz['answers'][str(current_q.get('id', current_idx))] = answer
+                    st.session_state.quiz['answers'][str(current_idx)] = session_store.encode_answer(current_q, answer)
+                    # A changed answer invalidates any grades from an earlier submission
+                    st.session_state.quiz.pop('grades', None)
                     st.session_state.quiz['current_index'] -= 1
                     st.rerun()
             
             with col2:
                 if current_idx < len(questions) - 1:
                     if st.button("Next"):
-                        st.session_state.quiz['answers'][str(current_q.get('id', current_idx))] = answer
+                        st.session_state.quiz['answers'][str(current_idx)] = session_store.encode_answer(current_q, answer)
+                        # A changed answer invalidates any grades from an earlier submission
+                        st.session_state.quiz.pop('grades', None)
                         st.session_state.quiz['current_index'] += 1
                         st.rerun()
                 else:
                     if st.button("Submit Quiz"):
-                        st.session_state.quiz['answers'][str(current_q.get('id', current_idx))] = answer
+                        st.session_state.quiz['answers'][str(current_idx)] = session_store.encode_answer(current_q, answer)
+                        with st.spinner("Grading your answers..."):
+                            grade_quiz(questions)
                         st.session_state.quiz_completed = True
                         st.rerun()
         except Exception as e:
@@ -283,60 +341,73 @@ elif mode == "Upload PDF":
     st.header("Generate and Take Quiz from PDF")
     
     uploaded_file = st.file_uploader("Upload a PDF or text file", type=["pdf", "txt"])
-    text = ""  # Initialize text variable
     
     if uploaded_file is not None:
-        if uploaded_file.type == "text/plain":
-            text = uploaded_file.getvalue().decode("utf-8")
-        elif uploaded_file.type == "application/pdf":
-            try:
-                reader = PyPDF2.PdfReader(uploaded_file)
-                text = "\n".join(page.extract_text() or "" for page in reader.pages)
-            except Exception:
-                st.error("Failed to extract text from PDF. Please try another file.")
-                st.stop()
-        
-        if not text.strip():
-            st.error("The uploaded file is empty or could not be processed.")
-            st.stop()
-        
-        number = st.number_input("Number of MCQs", min_value=1, value=5)
+        # A session keeps at most MAX_SESSION_QUESTIONS questions per quiz
+        number = st.number_input("Number of MCQs", min_value=1, max_value=session_store.MAX_SESSION_QUESTIONS, value=5)
         subject = st.text_input("Subject", "Computer Networks")
         tone = st.selectbox("Tone", ["Easy", "Medium", "Hard"])
         
         if st.button("Generate Quiz from PDF"):
+            # Extract the document only for this request so its text is not kept between reruns
+            text = ""
+            if uploaded_file.type == "text/plain":
+                text = uploaded_file.getvalue().decode("utf-8")
+            elif uploaded_file.type == "application/pdf":
+                try:
+                    reader = PyPDF2.PdfReader(uploaded_file)
+                    text = "\n".join(page.extract_text() or "" for page in reader.pages)
+                except Exception:
+                    st.error("Failed to extract text from PDF. Please try another file.")
+                    st.stop()
+            
+            if not text.strip():
+                st.error("The uploaded file is empty or could not be processed.")
+                st.stop()
+            
+            if len(text) > session_store.MAX_DOCUMENT_CHARS:
+                st.info(f"Using the first {session_store.MAX_DOCUMENT_CHARS:,} characters of the document.")
+                text = text[:session_store.MAX_DOCUMENT_CHARS]
+            
             try:
-                quiz = generate_quiz_from_pdf(text, number, subject, tone)
+                quiz, metrics = generate_quiz_from_pdf(text, number, subject, tone)
+                del text
+                st.session_state.generation_metrics = metrics
                 if not quiz:
                     st.error("Failed to generate quiz from PDF content")
                     st.stop()
                 
-                # Store in database
-                for q in quiz:
-                    try:
-                        insert_question(
-                            subject=subject,
-                            question=q['question'],
-                            answer=q['correct_answer'],
-                            difficulty=tone,
-                            question_type="MCQ",
-                            bloom_level="Remembering"
-                        )
-                    except Exception as e:
-                        st.error(f"Error saving question: {str(e)}")
-                        continue
-                
-                # Initialize quiz session state
-                st.session_state.pdf_quiz = {
-                    'questions': [
+                # Store questions and their options in one transaction
+                try:
+                    question_ids = insert_bulk_questions([
                         {
-                            'id': idx,
-                            'question': q['question'],
-                            'options': q['options'],
-                            'correct_answer': q['correct_answer']
+                            "subject": subject,
+                            "question": q['question'],
+                            "answer": q['correct_answer'],
+                            "difficulty": tone,
+                            "question_type": "MCQ",
+                            "bloom_level": "Remembering",
+                            "options": q.get('options')
                         }
-                        for idx, q in enumerate(quiz)
-                    ],
+                        for q in quiz
+                    ])
+                except Exception as e:
+                    question_ids = [None] * len(quiz)
+                    st.error(f"Error saving questions: {str(e)}")
+                
+                # Initialize quiz session state with handles into the shared cache
+                questions = [
+                    {
+                        'db_id': question_id,
+                        'question': q['question'],
+                        'question_type': "MCQ",
+                        'options': q['options'],
+                        'correct_answer': q['correct_answer']
+                    }
+                    for q, question_id in zip(quiz, question_ids)
+                ]
+                st.session_state.pdf_quiz = {
+                    'keys': session_store.store_questions(get_session_id(), "pdf_quiz", questions),
                     'answers': {},
                     'submitted': False
                 }
@@ -347,20 +418,27 @@ elif mode == "Upload PDF":
                 st.error(f"An error occurred: {e}")
                 st.text(traceback.format_exc())
     
+    display_generation_metrics()
+    
     # Display and handle the PDF quiz if it exists
     if 'pdf_quiz' in st.session_state:
         st.subheader("PDF Generated Quiz")
+        pdf_questions = resolve_questions(st.session_state.pdf_quiz['keys'], "pdf_quiz")
+        if pdf_questions is None:
+            del st.session_state.pdf_quiz
+            st.stop()
         
         if not st.session_state.pdf_quiz['submitted']:
             # Display questions and collect answers
-            for idx, q in enumerate(st.session_state.pdf_quiz['questions']):
+            for idx, q in enumerate(pdf_questions):
                 st.write(f"Q{idx+1}: {q['question']}")
-                st.session_state.pdf_quiz['answers'][str(idx)] = st.radio(
+                answer = st.radio(
                     f"Select your answer for Q{idx+1}",
                     q['options'],
                     key=f"pdf_q_{idx}",
                     index=None
                 )
+                st.session_state.pdf_quiz['answers'][str(idx)] = session_store.encode_answer(q, answer)
             
             if st.button("Submit Quiz"):
                 st.session_state.pdf_quiz['submitted'] = True
@@ -370,8 +448,8 @@ elif mode == "Upload PDF":
             st.subheader("Quiz Results")
             score = 0
             
-            for idx, q in enumerate(st.session_state.pdf_quiz['questions']):
-                user_answer = st.session_state.pdf_quiz['answers'].get(str(idx))
+            for idx, q in enumerate(pdf_questions):
+                user_answer = session_store.decode_answer(q, st.session_state.pdf_quiz['answers'].get(str(idx)))
                 correct_answer_text = q['correct_answer']  # This should be the full text
                 
                 # Get the index of the correct answer in options
@@ -396,4 +474,37 @@ elif mode == "Upload PDF":
                     else:
                         st.error("Incorrect")
             
-            st.success(f"### Your Score: {score}/{len(st.session_state.pdf_quiz['questions'])} 🎯")
\ No newline at end of file
+            st.success(f"### Your Score: {score}/{len(pdf_questions)} 🎯")
+
+# ========== Search Bank Mode ==========
+elif mode == "Search Bank":
+    st.header("Search the Question Bank")
+    
+    query = st.text_input("Keywords or syllabus topic", "three-way handshake")
+    subject_filter = st.sidebar.text_input("Subject (optional)", "")
+    type_filter = st.sidebar.selectbox("Question Type", ["Any", "MCQ", "Short Answer", "True/False"])
+    limit = st.sidebar.slider("Max Results", 5, 100, 20)
+    st.caption('Use +word to require, -word to exclude, "exact phrase" or prefix* for boolean search.')
+    
+    if query.strip():
+        results = search_questions(
+            query,
+            subject=subject_filter.strip() or None,
+            question_type=None if type_filter == "Any" else type_filter,
+            limit=limit
+        )
+        
+        if not results:
+            st.info("No matching questions found.")
+        else:
+            st.success(f"Found {len(results)} matching questions")
+            for r in results:
+                with st.expander(f"[{r['subject']} · {r['question_type']} · {r['difficulty']}] {r['question'][:80]}", expanded=False):
+                    st.markdown(r["question"])
+                    if r.get("answer"):
+                        st.markdown(f"Correct Answer: {r['answer']}")
+                    if r.get("syllabus"):
+                        st.caption(f"Syllabus: {r['syllabus']}")
+                    st.caption(f"Bloom's Level: {r['bloom_level']} · Relevance: {r['score']:.3f}")
+
+display_session_memory()
@@ -0,0 +1,323 @@
+"""
+Simulates a classroom of students starting quizzes at the same moment and reports how the
+backend holds up: throughput, p50/p95/p99 latency and error rate per step, plus database
+connection counts.
+
+The LLM is replaced by a local fake with configurable latency, and by default the database is
+a throwaway embedded SQLite file, so no API key or MySQL server is needed. The test writes
+seed questions, generated questions and quiz results, so a MySQL run must name a dedicated
+test database with --mysql-database; it never uses the configured MYSQL_DATABASE.
+
+Usage:
+    python -m scripts.load_test --students 60 --pdf-share 0.3
+    python -m scripts.load_test --backend mysql --mysql-database quiz_load_test --students 200 --json report.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+SUBJECT = "Load Test"
+DIFFICULTY = "Medium"
+
+SAMPLE_DOCUMENT = "\n".join(
+    f"Section {i}: The transmission control protocol uses a three-way handshake, sequence numbers "
+    f"and a sliding window to deliver a reliable byte stream over an unreliable network."
+    for i in range(200)
+)
+
+
+class FakeResponse:
+    def __init__(self, content, input_tokens, output_tokens):
+        self.content = content
+        self.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+
+class FakeLLM:
+    """Stands in for ChatGroq: answers question-generation prompts in the expected format after a delay."""
+
+    def __init__(self, latency_ms, jitter_ms):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def invoke(self, prompt):
+        prompt = str(prompt)
+        time.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+        count = re.search(r"Generate (?:exactly )?(\d+)", prompt)
+        count = int(count.group(1)) if count else 1
+        tag = uuid.uuid4().hex[:8]
+
+        if "Return only JSON" in prompt:
+            content = json.dumps([
+                {
+                    "question": f"Which mechanism does TCP use ({tag}-{i})?",
+                    "options": ["Three-way handshake", "Broadcast", "Flooding", "Polling"],
+                    "correct_answer": "Three-way handshake",
+                }
+                for i in range(count)
+            ])
+        elif "a) <option1>" in prompt:
+            content = "\n\n".join(
+                f"Q{i + 1}: Which mechanism does TCP use ({tag}-{i})?\n"
+                f"a) Broadcast\nb) Three-way handshake (Correct)\nc) Flooding\nd) Polling"
+                for i in range(count)
+            )
+        else:
+            content = "\n\n".join(
+                f"Q{i + 1}: What does TCP use to set up a connection ({tag}-{i})?\nAnswer: A three-way handshake"
+                for i in range(count)
+            )
+
+        return FakeResponse(content, len(prompt) // 4, len(content) // 4)
+
+
+class Recorder:
+    """Collects per-step latencies and errors from all student threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+
+    @contextlib.contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self.errors[name][type(e).__name__] += 1
+            raise
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.latencies[name].append(elapsed)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def seed_bank(database, count):
+    """Fill the bank with MCQ and short-answer questions for the Take Quiz flow."""
+    questions = []
+    for i in range(count):
+        questions.append({
+            "subject": SUBJECT, "difficulty": DIFFICULTY, "question_type": "MCQ", "bloom_level": "Remembering",
+            "question": f"Which layer does protocol {i} belong to?", "answer": "Transport",
+            "options": ["Application", "Transport", "Network", "Link"], "syllabus": "OSI Model",
+        })
+        questions.append({
+            "subject": SUBJECT, "difficulty": DIFFICULTY, "question_type": "Short Answer", "bloom_level": "Remembering",
+            "question": f"What does protocol {i} guarantee?", "answer": "Reliable in-order delivery",
+            "syllabus": "TCP Protocol",
+        })
+    database.insert_bulk_questions(questions)
+
+
+def take_quiz_flow(student, args, recorder, modules):
+    question_generator, answer_grader, database = modules
+
+    with recorder.step("generate_quiz"):
+        questions = question_generator.generate_quiz(SUBJECT, args.question_type, args.questions, DIFFICULTY)
+        # An empty quiz counts as a failure of this step, not only of the whole flow
+        if not questions:
+            raise RuntimeError("generate_quiz returned no questions")
+
+    # Half the students answer correctly, half pick something else
+    answers = [
+        q["correct_answer"] if random.random() < 0.5 else (q.get("options") or ["I am not sure"])[0]
+        for q in questions
+    ]
+    with recorder.step("grade"):
+        graded = answer_grader.grade_submission(
+            [q["question"] for q in questions], answers,
+            [q["correct_answer"] for q in questions], [q["question_type"] for q in questions],
+            use_llm=False
+        )
+
+    with recorder.step("save_quiz_result"):
+        database.save_quiz_result(student, f"quiz-{student}", sum(g["is_correct"] for g in graded), len(graded))
+
+
+def pdf_quiz_flow(student, args, recorder, modules):
+    question_generator, answer_grader, database = modules
+
+    with recorder.step("generate_quiz_from_pdf"):
+        quiz, _ = question_generator.generate_quiz_from_pdf(SAMPLE_DOCUMENT, args.questions, SUBJECT, DIFFICULTY)
+        if not quiz:
+            raise RuntimeError("generate_quiz_from_pdf returned no questions")
+
+    with recorder.step("insert_bulk_questions"):
+        database.insert_bulk_questions([
+            {
+                "subject": SUBJECT, "question": q["question"], "answer": q["correct_answer"],
+                "difficulty": DIFFICULTY, "question_type": "MCQ", "bloom_level": "Remembering",
+                "options": q["options"],
+            }
+            for q in quiz
+        ])
+
+    answers = [random.choice(q["options"]) for q in quiz]
+    with recorder.step("grade"):
+        graded = answer_grader.grade_submission(
+            [q["question"] for q in quiz], answers,
+            [q["correct_answer"] for q in quiz], ["MCQ"] * len(quiz),
+            use_llm=False
+        )
+
+    with recorder.step("save_quiz_result"):
+        database.save_quiz_result(student, f"pdf-{student}", sum(g["is_correct"] for g in graded), len(graded))
+
+
+def run(args):
+    # Configure the environment before the backend modules read it at import time
+    if args.backend == "sqlite":
+        os.environ["DB_BACKEND"] = "sqlite"
+        os.environ["SQLITE_PATH"] = args.sqlite_path or os.path.join(tempfile.mkdtemp(), "load_test.db")
+    else:
+        os.environ["DB_BACKEND"] = "mysql"
+        os.environ["MYSQL_DATABASE"] = args.mysql_database
+    os.environ.setdefault("GROQ_API_KEY", "load-test")
+
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log if args.quiet else sys.stdout):
+        from backend import answer_grader, database, question_generator
+        question_generator.llm = FakeLLM(args.llm_latency_ms, args.llm_jitter_ms)
+        seed_bank(database, args.seed_questions)
+        if args.question_type == "Short Answer":
+            answer_grader.warm_up(background=False)
+
+    stats = database._backend.stats
+    opened_before = stats["connections_opened"]
+    recorder = Recorder()
+    flow_counts = defaultdict(lambda: {"completed": 0, "failed": 0})
+    counts_lock = threading.Lock()
+    barrier = threading.Barrier(args.students)
+
+    def student(index):
+        name = f"student-{index:04d}"
+        flow = pdf_quiz_flow if random.random() < args.pdf_share else take_quiz_flow
+        if args.ramp_seconds:
+            time.sleep(random.uniform(0, args.ramp_seconds))
+        else:
+            # Everyone presses Start at the same moment
+            barrier.wait()
+        try:
+            with recorder.step(f"{flow.__name__}_total"):
+                flow(name, args, recorder, (question_generator, answer_grader, database))
+            outcome = "completed"
+        except Exception:
+            outcome = "failed"
+        with counts_lock:
+            flow_counts[flow.__name__][outcome] += 1
+
+    with contextlib.redirect_stdout(log if args.quiet else sys.stdout):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.students) as pool:
+            list(pool.map(student, range(args.students)))
+        wall = time.perf_counter() - start
+
+    steps = {}
+    for name, values in recorder.latencies.items():
+        errors = sum(recorder.errors[name].values())
+        steps[name] = {
+            "count": len(values),
+            "throughput_per_s": len(values) / wall if wall else 0.0,
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+            "max_ms": max(values),
+            "error_rate": errors / len(values),
+            "errors": dict(recorder.errors[name]),
+        }
+
+    return {
+        "students": args.students,
+        "backend": args.backend,
+        "llm_latency_ms": args.llm_latency_ms,
+        "wall_seconds": wall,
+        "flows": {name: dict(counts) for name, counts in flow_counts.items()},
+        "connections": {
+            "opened": stats["connections_opened"] - opened_before,
+            "open": stats["connections_open"],
+            "peak_active": stats["connections_peak"],
+            "still_active": stats["connections_active"],
+        },
+        "steps": steps,
+    }
+
+
+def print_report(report):
+    print(f"\n📊 {report['students']} students on {report['backend']} in {report['wall_seconds']:.2f}s "
+          f"(fake LLM latency {report['llm_latency_ms']} ms)")
+    for name, counts in report["flows"].items():
+        print(f"   {name}: {counts['completed']} completed, {counts['failed']} failed")
+    conns = report["connections"]
+    print(f"   connections: {conns['opened']} opened, {conns['open']} open, peak {conns['peak_active']} checked out, "
+          f"{conns['still_active']} not returned\n")
+
+    header = f"{'step':<30}{'count':>7}{'ops/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, s in sorted(report["steps"].items()):
+        print(f"{name:<30}{s['count']:>7}{s['throughput_per_s']:>9.1f}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}"
+              f"{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}{s['error_rate']:>8.1%}")
+        for error, count in s["errors"].items():
+            print(f"{'':<4}{error}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a classroom quiz spike against the backend.")
+    parser.add_argument("--students", type=int, default=30, help="Concurrent students")
+    parser.add_argument("--questions", type=int, default=10, help="Questions per quiz")
+    parser.add_argument("--question-type", default="MCQ", choices=["MCQ", "Short Answer"],
+                        help="Take Quiz question type; Short Answer exercises the embedding grader")
+    parser.add_argument("--pdf-share", type=float, default=0.3, help="Fraction of students taking the PDF quiz flow")
+    parser.add_argument("--ramp-seconds", type=float, default=0.0, help="Spread starts over this many seconds instead of all at once")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0, help="Simulated LLM response time")
+    parser.add_argument("--llm-jitter-ms", type=float, default=200.0, help="Random variation of the LLM response time")
+    parser.add_argument("--seed-questions", type=int, default=200, help="Questions of each type seeded into the bank")
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "mysql"], help="Database backend to test")
+    parser.add_argument("--sqlite-path", default=None, help="SQLite file to use (defaults to a temporary file)")
+    parser.add_argument("--mysql-database", default=None,
+                        help="Dedicated MySQL database to fill with test data; required with --backend mysql")
+    parser.add_argument("--json", default=None, help="Also write the report to this JSON file")
+    parser.add_argument("--verbose", dest="quiet", action="store_false", help="Show backend console output")
+    args = parser.parse_args()
+    if args.backend == "mysql" and not args.mysql_database:
+        parser.error("--backend mysql writes test questions and results; pass --mysql-database with a dedicated test database")
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Copies the question bank, MCQ options and quiz results from the configured MySQL server into an
+embedded SQLite database, keeping row ids so references between tables stay valid.
+
+The MySQL schema is upgraded first (as the app does at startup), so banks created before the
+syllabus column and the option and exposure tables existed can be copied too.
+
+The target must not hold any rows yet: copied ids would collide with existing ones and attach
+options to the wrong questions, so a non-empty target is refused.
+
+Usage:
+    python -m scripts.migrate_mysql_to_sqlite --sqlite-path exam_generator.db
+"""
+import argparse
+from backend.storage import MySQLBackend, SQLiteBackend
+
+TABLES = {
+    "questions": ["id", "subject", "question", "answer", "difficulty", "question_type", "bloom_level", "syllabus"],
+    "quiz_results": ["id", "user_id", "quiz_id", "score", "total_questions", "percentage"],
+    "question_options": ["id", "question_id", "option_index", "option_text", "is_correct"],
+    "question_exposures": ["user_id", "question_id", "seen_at"],
+}
+
+
+def copy_table(source, target, table, columns, batch_size):
+    """Streams one table from MySQL into SQLite in batches and returns the number of rows copied."""
+    source_conn = source.connect()
+    source_cursor = source_conn.cursor()
+    target_conn = target.connect()
+
+    source_cursor.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {columns[0]}")
+    insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+
+    copied = 0
+    try:
+        while True:
+            rows = source_cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            target_conn.executemany(insert, rows)
+            copied += len(rows)
+            print(f"  {table}: {copied} rows")
+        target_conn.commit()
+    except Exception as e:
+        print(f"❌ Error copying {table}: {str(e)}")
+        target_conn.rollback()
+        raise
+    finally:
+        source_cursor.close()
+        source.release(source_conn)
+        target.release(target_conn)
+
+    return copied
+
+
+def find_existing_rows(target):
+    """Returns the target tables that already contain rows."""
+    conn = target.connect()
+    try:
+        return [table for table in TABLES if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()]
+    finally:
+        target.release(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the MySQL question bank into SQLite.")
+    parser.add_argument("--sqlite-path", default=None, help="Target SQLite file (defaults to SQLITE_PATH)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows copied per transaction batch")
+    args = parser.parse_args()
+
+    source = MySQLBackend()
+    target = SQLiteBackend(args.sqlite_path)
+    target.initialize()
+
+    existing = find_existing_rows(target)
+    if existing:
+        target.close()
+        raise SystemExit(f"❌ {target.path} already has rows in {', '.join(existing)}; migrate into a new SQLite file instead")
+
+    print("Upgrading the MySQL schema if needed")
+    source.initialize()
+
+    for table, columns in TABLES.items():
+        copied = copy_table(source, target, table, columns, args.batch_size)
+        print(f"✅ Copied {copied} rows from {table}")
+
+    # Merge the FTS segments written during the bulk copy and refresh planner statistics
+    conn = target.connect()
+    conn.execute("INSERT INTO questions_fts (questions_fts) VALUES ('optimize')")
+    conn.execute("ANALYZE")
+    conn.commit()
+    target.release(conn)
+    target.close()
+    print(f"✅ Migration to {target.path} complete")
+
+
+if __name__ == "__main__":
+    main()